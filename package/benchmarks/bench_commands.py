@@ -0,0 +1,163 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A benchmark timing the commands against generated notes trees, compared with a stored baseline.
+#
+#   python benchmarks/bench_commands.py --sizes 1000 --sizes 10000
+#   python benchmarks/bench_commands.py --save-baseline
+
+import click
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from corpus import generate_corpus
+from dev_tools.actions import actions, close
+from dev_tools.meeting import get_meeting_placeholders
+from dev_tools.store import open_store, get_store_path, get_open_actions
+from dev_tools.templates import render
+from dev_tools.title import title_notes
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+TEMPLATES_DIR = Path(__file__).parents[2] / "templates"
+# Differences smaller than this are noise whatever the ratio
+MIN_REGRESSION = 0.05
+
+
+@click.command()
+@click.option("--sizes", type=int, multiple=True, default=(1000, 10000, 100000), help="Numbers of notes to benchmark with.")
+@click.option("--repeat", type=int, default=3, help="Runs per benchmark, the fastest is kept.")
+@click.option("--seed", type=int, default=0, help="Seed of the generated notes.")
+@click.option("--baseline", "baseline_path", type=click.Path(dir_okay=False, path_type=Path), default=BASELINE_PATH, help="Stored results to compare against.")
+@click.option("--save-baseline", is_flag=True, help="Store these results as the new baseline.")
+@click.option("--max-regression", type=float, default=1.5, help="Allowed slow down against the baseline, as a ratio.")
+def cli(sizes, repeat, seed, baseline_path, save_baseline, max_regression):
+    baseline = load_baseline(baseline_path)
+    results = dict()
+    failures = list()
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="dev-tools-bench-") as home:
+            display(f"~~~ {size} notes ~~~", "green")
+            results[str(size)] = run_benchmarks(Path(home), size, seed, repeat)
+        for name, elapsed in results[str(size)].items():
+            expected = baseline.get(str(size), dict()).get(name)
+            line = f"{name:<16} {elapsed * 1000:>10.1f} ms"
+            if expected is None:
+                display(line)
+                continue
+            line += f"  baseline {expected * 1000:>10.1f} ms ({elapsed / expected:.2f}x)"
+            if elapsed > expected * max_regression and elapsed - expected > MIN_REGRESSION:
+                failures.append(f"{name} at {size} notes")
+                display(line, "bright_red")
+            else:
+                display(line)
+
+    if save_baseline:
+        for size, timings in results.items():
+            baseline.setdefault(size, dict()).update(timings)
+        with open(baseline_path, "w") as file:
+            json.dump(baseline, file, indent=4, sort_keys=True)
+            file.write("\n")
+        display(f"Saved baseline to {baseline_path}", "bright_green")
+    elif failures:
+        display(f"Regressed past the baseline: {', '.join(failures)}", "bright_red")
+        raise SystemExit(1)
+
+
+def run_benchmarks(home, size, seed, repeat):
+    # Each command runs in-process against a fresh HOME holding the generated
+    # notes and a copy of the templates.
+    dev_tools_dir = home / ".dev-tools"
+    shutil.copytree(TEMPLATES_DIR, dev_tools_dir / "templates")
+    os.makedirs(dev_tools_dir / "dot-files")
+    generate_corpus(home / "Notes", size, seed=seed)
+
+    def actions_cold():
+        for state_file in (".dtscancache", ".dtactions.db"):
+            for path in (dev_tools_dir / "dot-files").glob(f"{state_file}*"):
+                os.remove(path)
+        actions(rebuild=True)
+
+    def actions_close():
+        store = open_store(get_store_path(dev_tools_dir))
+        # The oldest open action by its id, e.g. '2020-01-06_11-00-00_0'
+        action_id = next(iter(get_open_actions(store))).split(" | ")[0]
+        store.close()
+        close.callback(close_patterns=(action_id,), from_stdin=False)
+
+    def actions_limit():
+        # Run twice on a store already holding the listed actions, which must
+        # leave the notes the limit stopped at for a later sync
+        for sort in ("oldest", "newest"):
+            actions(limit=20, sort=sort)
+            actions(limit=20, sort=sort)
+
+    def render_notes():
+        # A tenth as many notes are rendered as there are in the tree
+        output_dir = home / "Rendered"
+        shutil.rmtree(output_dir, ignore_errors=True)
+        for number in range(max(size // 10, 1)):
+            placeholders = get_meeting_placeholders(datetime(2024, 1, 1, number // 60 % 24, number % 60), f"Meeting {number}")
+            render(dev_tools_dir / "templates" / "meeting_note", placeholders, output_dir / str(number // 1000), cache_dir=dev_tools_dir / ".template_cache")
+
+    benchmarks = {
+        "actions cold": actions_cold,
+        "actions warm": actions,
+        "actions close": actions_close,
+        "actions limit": actions_limit,
+        "title dry run": lambda: title_notes(dry_run=True, full=True),
+        "render notes": render_notes,
+    }
+    timings = dict()
+    with isolated_home(home):
+        for name, benchmark in benchmarks.items():
+            timings[name] = min(time_call(benchmark) for _ in range(repeat))
+    return timings
+
+
+@contextlib.contextmanager
+def isolated_home(home):
+    previous = os.environ.get("HOME")
+    os.environ["HOME"] = str(home)
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ["HOME"]
+        else:
+            os.environ["HOME"] = previous
+
+
+def time_call(function):
+    # Commands report their errors instead of raising them
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+    if "There was a failure." in output.getvalue():
+        raise RuntimeError(output.getvalue()[-2000:])
+    return elapsed
+
+
+def load_baseline(baseline_path):
+    if not baseline_path.is_file():
+        return dict()
+    with open(baseline_path, "r") as file:
+        return json.load(file)
+
+
+def display(message, color="bright_cyan"):
+    click.echo(click.style(message, fg=color))
+
+
+if __name__ == "__main__":
+    cli()
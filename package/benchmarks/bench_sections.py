@@ -0,0 +1,71 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A benchmark showing the section parser stays linear on pathological notes.
+#
+#   python benchmarks/bench_sections.py --lines 2000 --steps 6
+
+import click
+import time
+
+from dev_tools.sections import parse_sections
+
+WANTED = ("### Actions", "### Check-in", "## Goals")
+
+
+@click.command()
+@click.option("--lines", type=int, default=2000, help="Size of the smallest note.")
+@click.option("--steps", type=int, default=6, help="Number of times the note size is doubled.")
+@click.option("--repeat", type=int, default=5, help="Runs per size, the fastest is kept.")
+@click.option("--max-ratio", type=float, default=3.0, help="Allowed growth in time per line.")
+def cli(lines, steps, repeat, max_ratio):
+    results = list()
+    for shape, build in NOTE_SHAPES.items():
+        per_line = list()
+        for step in range(steps):
+            size = lines * 2**step
+            note = build(size)
+            elapsed = min(time_parse(note) for _ in range(repeat))
+            per_line.append(elapsed / size)
+            display(f"{shape:<20} {size:>9} lines {elapsed * 1000:>9.2f} ms")
+        ratio = max(per_line) / min(per_line)
+        results.append((shape, ratio))
+        display(f"{shape:<20} per-line time ratio {ratio:.2f}", "bright_green")
+
+    failures = [shape for shape, ratio in results if ratio > max_ratio]
+    if failures:
+        display(f"Non-linear parsing detected for: {', '.join(failures)}", "bright_red")
+        raise SystemExit(1)
+
+
+def time_parse(note):
+    start = time.perf_counter()
+    parse_sections(note.splitlines(keepends=True), wanted=WANTED)
+    return time.perf_counter() - start
+
+
+def long_actions_without_tags(size):
+    # The old lookahead regex backtracked over every line looking for '### Tags'
+    return "# _MEETING_ <br/> Monday\n\n### Actions\n" + "- an action\n" * size
+
+
+def blank_lines_without_tags(size):
+    return "# _MEETING_ <br/> Monday\n\n### Actions\n" + "\n" * size
+
+
+def kit_without_sections(size):
+    # The old KIT regex nested `(?:.*\n)*` groups ahead of each heading
+    return "# _Keeping in Touch_ <br/> Monday\n" + "some notes\n" * size
+
+
+NOTE_SHAPES = {
+    "long-actions": long_actions_without_tags,
+    "blank-lines": blank_lines_without_tags,
+    "kit-no-sections": kit_without_sections,
+}
+
+
+def display(message, color="bright_cyan"):
+    click.echo(click.style(message, fg=color))
+
+
+if __name__ == "__main__":
+    cli()
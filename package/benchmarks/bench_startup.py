@@ -0,0 +1,78 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A benchmark keeping the import time `dev-tools` commands add to a bare interpreter under a budget.
+#
+#   python benchmarks/bench_startup.py --repeat 5
+
+import click
+import subprocess
+import sys
+
+# Each case runs a command line through the `dev-tools` group in a fresh
+# interpreter and lists modules it must never import.
+STARTUP_CASES = {
+    "dev-tools --help": (
+        ["--help"],
+        ("git", "virtualenv", "sqlite3", "multiprocessing", "watchdog", "dev_tools.actions", "dev_tools.newenv"),
+    ),
+    "dev-tools actions --help": (
+        ["actions", "--help"],
+        ("git", "virtualenv", "multiprocessing", "watchdog", "dev_tools.newenv"),
+    ),
+}
+
+
+@click.command()
+@click.option("--repeat", type=int, default=5, help="Runs per command, the fastest is kept.")
+@click.option("--help-budget", type=float, default=80.0, help="Allowed import time of `dev-tools --help` in ms.")
+@click.option("--actions-budget", type=float, default=120.0, help="Allowed import time of `dev-tools actions` in ms.")
+def cli(repeat, help_budget, actions_budget):
+    budgets = {"dev-tools --help": help_budget, "dev-tools actions --help": actions_budget}
+    # The interpreter's own start up, e.g. site, is not counted against a command
+    baseline = min(time_imports(None)[0] for _ in range(repeat))
+    failures = list()
+    for case, (arguments, forbidden) in STARTUP_CASES.items():
+        runs = [time_imports(arguments) for _ in range(repeat)]
+        elapsed = min(total for total, _ in runs) - baseline
+        imported = [module for module in forbidden if module in runs[0][1]]
+        display(f"{case:<26} {elapsed:>8.2f} ms imports (budget {budgets[case]:.0f} ms)")
+        if elapsed > budgets[case]:
+            failures.append(f"{case} took {elapsed:.2f} ms")
+        if imported:
+            failures.append(f"{case} imported {', '.join(imported)}")
+
+    if failures:
+        for failure in failures:
+            display(failure, "bright_red")
+        raise SystemExit(1)
+    display("Startup within budget", "bright_green")
+
+
+def time_imports(arguments):
+    # Returns the total import time in ms and every module imported, read from
+    # the `-X importtime` report of a fresh interpreter.
+    code = f"from dev_tools.dev_tools import cli; cli({arguments!r})" if arguments else "pass"
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    total = 0
+    modules = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules.add(name.strip())
+            # Only top level imports, nested ones are already in their parent
+            if not name.startswith("  ") and name.startswith(" "):
+                total += int(cumulative)
+    return total / 1000, modules
+
+
+def display(message, color="bright_cyan"):
+    click.echo(click.style(message, fg=color))
+
+
+if __name__ == "__main__":
+    cli()
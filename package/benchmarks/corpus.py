@@ -0,0 +1,175 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A deterministic generator of realistic notes trees for benchmarks.
+#
+#   python benchmarks/corpus.py /tmp/corpus/Notes --notes 10000 --seed 0
+
+import click
+import os
+import random
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+WORDS = (
+    "release deploy review budget roadmap hiring design api latency migration "
+    "customer incident backlog sprint retro onboarding security audit metrics "
+    "dashboard pipeline database cache rollout feedback planning estimate risk "
+    "dependency contract vendor training offsite demo prototype launch support"
+).split()
+PEOPLE = ("Alice", "Bob", "Carol", "Dan", "Erin", "Frank", "Grace", "Heidi")
+TAGS = ("alpha", "beta", "platform", "infra", "hiring", "q-planning", "ops", "design")
+
+# Share of notes of each kind, the rest are meeting notes
+DAILY_SHARE = 0.2
+KIT_SHARE = 0.1
+# Share of notes given a pathological shape
+PATHOLOGICAL_SHARE = 0.05
+LONG_ACTIONS = 500
+
+
+@click.command()
+@click.argument("notes_dir", type=click.Path(file_okay=False, path_type=Path))
+@click.option("--notes", type=int, default=1000, help="Number of notes to generate.")
+@click.option("--seed", type=int, default=0, help="Seed, the same seed always gives the same tree.")
+@click.option("--lines", type=int, default=20, help="Typical number of lines of free text per note.")
+def cli(notes_dir, notes, seed, lines):
+    counts = generate_corpus(notes_dir, notes, seed=seed, lines=lines)
+    for kind, count in counts.items():
+        display(f"{kind:<14} {count:>8}")
+
+
+def generate_corpus(notes_dir, notes, seed=0, lines=20, start=datetime(2020, 1, 6, 9)):
+    # Writes `notes` notes under `notes_dir` in the YYYY/MM-Month/DD-Day layout,
+    # with KIT notes under 'Meeting Notes/Keeping in Touch/<member>/', and
+    # returns how many of each kind were written. Notes are spread over working
+    # days a few to a day, so file mtimes are the only thing that varies by run.
+    rng = random.Random(seed)
+    counts = {"meeting": 0, "titled meeting": 0, "daily": 0, "kit": 0, "pathological": 0}
+    date = start
+    made_dirs = set()
+    for number in range(notes):
+        date = next_slot(date, rng)
+        roll = rng.random()
+        if roll < KIT_SHARE:
+            member = rng.choice(PEOPLE)
+            directory = notes_dir / "Meeting Notes" / "Keeping in Touch" / member
+            name = f"{date:%Y-%m-%d_%H-%M-%S} - Keeping in Touch.md"
+            contents = kit_note(date, rng, lines)
+            kind = "kit"
+        elif roll < KIT_SHARE + DAILY_SHARE:
+            directory = get_day_dir(notes_dir, date)
+            name = f"{date:%Y-%m-%d_%H-%M-%S} - Daily Notes.md"
+            contents = daily_note(date, rng, lines)
+            kind = "daily"
+        else:
+            directory = get_day_dir(notes_dir, date)
+            name = f"{date:%Y-%m-%d_%H-%M-%S}.md"
+            if rng.random() < PATHOLOGICAL_SHARE:
+                contents = rng.choice(PATHOLOGICAL_NOTES)(date, rng, lines)
+                kind = "pathological"
+            else:
+                title = sentence(rng, 3).title() if rng.random() < 0.5 else "_MEETING_"
+                contents = meeting_note(date, rng, lines, title)
+                kind = "meeting" if title == "_MEETING_" else "titled meeting"
+        if directory not in made_dirs:
+            os.makedirs(directory, exist_ok=True)
+            made_dirs.add(directory)
+        with open(directory / name, "w") as file:
+            file.write(contents)
+        counts[kind] += 1
+    return counts
+
+
+def next_slot(date, rng):
+    # Meetings start on the half hour between 09:00 and 17:00 on weekdays
+    date += timedelta(minutes=30 * rng.randint(1, 4))
+    if date.hour >= 17:
+        date = (date + timedelta(days=1)).replace(hour=9, minute=0)
+    while date.weekday() >= 5:
+        date += timedelta(days=1)
+    return date
+
+
+def get_day_dir(notes_dir, date):
+    return notes_dir / date.strftime("%Y") / date.strftime("%m-%B") / date.strftime("%d-%A")
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def bullets(items):
+    return "".join(f"- {item}\n" for item in items) or "- \n"
+
+
+def free_text(rng, lines):
+    return "".join(sentence(rng, rng.randint(4, 14)).capitalize() + ".\n" for _ in range(rng.randint(lines // 2, lines)))
+
+
+def meeting_note(date, rng, lines, title="_MEETING_", actions=None, tags=True):
+    actions = actions if actions is not None else rng.randint(0, 5)
+    note = (
+        f"# {title} <br/> {date:%A, %d %b %Y}\n"
+        "Document to record and reference notes kept during this meeting.\n\n"
+        f"### Agenda & Notes\n{free_text(rng, lines)}\n"
+        f"### Attendees\n{bullets(rng.sample(PEOPLE, rng.randint(1, 4)))}\n"
+        f"### Decisions\n{bullets(sentence(rng, 5) for _ in range(rng.randint(0, 3)))}\n"
+        f"### Actions\n{bullets(sentence(rng, 6) for _ in range(actions))}\n"
+        )
+    if tags:
+        note += f"### Tags\n{bullets(rng.sample(TAGS, rng.randint(0, 3)))}"
+    return note
+
+
+def daily_note(date, rng, lines):
+    return (
+        f"# _Daily Notes_ <br/> {date:%A, %d %b %Y}\n"
+        "Document to record and reference notes for the day.\n\n\n"
+        f"## Wellness\n### How was my general mood today?\n- {rng.choice(('good', 'ok', 'tired'))}\n\n"
+        "## The Day's Goals\n### My Top Three Objectives\n"
+        f"{bullets(sentence(rng, 4) for _ in range(3))}\n"
+        f"### Notes on Objective #1\n{free_text(rng, lines)}\n"
+        f"### Actions\n{bullets(sentence(rng, 6) for _ in range(rng.randint(0, 3)))}\n"
+        f"### Tags\n{bullets(rng.sample(TAGS, rng.randint(0, 2)))}"
+        )
+
+
+def kit_note(date, rng, lines):
+    return (
+        f"# _Keeping in Touch_ <br/> {date:%A, %d %b %Y}\n"
+        "Document to record and reference notes during keeping in touch meetings with team members.\n\n"
+        f"### Last We Spoke\n{bullets(sentence(rng, 6) for _ in range(2))}\n"
+        f"### Check-in\n{free_text(rng, lines // 2)}\n"
+        f"## Goals\n{bullets(sentence(rng, 5) for _ in range(rng.randint(1, 3)))}\n"
+        "## Actions\n### Proposed Actions Last KIT\n- \n\n"
+        "### Feedback on Actions from Last KIT\n- \n\n"
+        f"### Actions\n{bullets(sentence(rng, 6) for _ in range(rng.randint(0, 4)))}\n"
+        "### Tags\n- \n"
+        )
+
+
+def missing_tags_note(date, rng, lines):
+    return meeting_note(date, rng, lines, tags=False)
+
+
+def long_actions_note(date, rng, lines):
+    return meeting_note(date, rng, lines, actions=LONG_ACTIONS, tags=rng.random() < 0.5)
+
+
+def blank_lines_note(date, rng, lines):
+    return f"# _MEETING_ <br/> {date:%A, %d %b %Y}\n\n### Actions\n" + "\n" * (lines * 100)
+
+
+def no_sections_note(date, rng, lines):
+    return free_text(rng, lines * 10)
+
+
+PATHOLOGICAL_NOTES = (missing_tags_note, long_actions_note, blank_lines_note, no_sections_note)
+
+
+def display(message, color="bright_cyan"):
+    click.echo(click.style(message, fg=color))
+
+
+if __name__ == "__main__":
+    cli()
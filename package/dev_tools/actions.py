@@ -6,47 +6,86 @@ import os
 import re
 import json
 
+from datetime import date, timedelta
 from pathlib import Path
 
+from dev_tools import daemon
+from dev_tools.archive import stat_note
+from dev_tools.config import load_config, get_notes_dirs
+from dev_tools.instrument import profiled, phase, count, record_error
+from dev_tools.scan import scan_files, DEFAULT_CHUNK_SIZE
+from dev_tools.sections import read_sections, read_titled_sections, get_list_items
+from dev_tools.store import (
+    open_store, get_store_path, find_actions, sync_actions, close_actions, get_closed_actions, split_action, get_series,
+    rebuild_aggregates, get_open_ages, get_open_count, get_weekly_totals, get_week,
+    )
+from dev_tools.walk import walk_roots_by_name, scan_roots, in_date_range, get_date_range
+
+TIMESTAMP_REGEX = r'^[0-9]{4}-[0-9]{2}-[0-9]{2}_[0-9]{2}-[0-9]{2}-[0-9]{2}'
+SCAN_CACHE_VERSION = 3
+# Open actions are counted by age in these many days or fewer, then older
+AGE_BUCKETS = (7, 30, 90, 365)
+
 @click.group(invoke_without_command=True)
+@click.option('--rebuild', is_flag=True, help='Ignore the scan cache and re-parse every note.')
+@click.option('--workers', type=int, default=None, help='Processes used to parse notes, 1 disables parallel scanning.')
+@click.option('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Notes handed to a worker at a time.')
+@click.option('--since', default=None, help='Only notes on or after this date, e.g. 2026-09-17, 2026-09, 2026 or yesterday.')
+@click.option('--until', default=None, help='Only notes on or before this date, e.g. 2026-09-17, 2026-09, 2026 or today.')
+@click.option('--format', 'output_format', type=click.Choice(['plain', 'ndjson', 'json']), default='plain', help='Write actions as lines, one JSON object per line or a JSON array.')
+@click.option('--stream', is_flag=True, help='Write each open action as soon as its note is read, updating the store at the end.')
+@click.option('--limit', type=click.IntRange(min=1), default=None, help='Stop after this many open actions, reading no further notes.')
+@click.option('--sort', type=click.Choice(['oldest', 'newest']), default='oldest', help='Order of the notes actions are listed from.')
 @click.pass_context
-def cli(ctx):
+@profiled('actions')
+def cli(ctx, rebuild, workers, chunk_size, since, until, output_format, stream, limit, sort):
     if not ctx.invoked_subcommand:
-        actions()
+        actions(
+            rebuild=rebuild, workers=workers, chunk_size=chunk_size, since=since, until=until,
+            output_format=output_format, stream=stream, limit=limit, sort=sort,
+            )
 
 
 @cli.command()
 @click.argument(
-    'close_pattern',
+    'close_patterns',
+    nargs=-1,
     type=str
 )
-def close(close_pattern):
+@click.option('--stdin', 'from_stdin', is_flag=True, help='Also read action ids or patterns from stdin, one per line.')
+def close(close_patterns, from_stdin):
     dev_tools_dir = Path.home() / '.dev-tools'
-    notes_dir = Path.home() / "Notes/"
 
     is_successful = False
     error_message = ''
 
     try:
-        actions_file_path = dev_tools_dir / 'dot-files'/ '.dtactions'
-        actions_file = initialise_actions_file(actions_file_path)
-        for action in actions_file['active']:
-            matches = [action_id for action_id in actions_file['active'] if re.search(close_pattern, action_id)]
-        if not matches:
-            return display('Could not match an action')
-        if len(matches) > 1:
-            display('The pattern matched multiple actions')
-            return [ display(f"{id+1:>5}: {action}") for id, action in enumerate(matches) ]
-        display(f'Closed {matches[0]}')
-        actions_file['closed'] += matches
-        actions_file['active'] = list(set(actions_file['active']).difference(set(matches)))
-        with open(actions_file_path, 'w') as file:
-            json.dump(actions_file, file, indent=2)
-        
+        close_patterns = list(close_patterns)
+        if from_stdin:
+            close_patterns += [line.strip() for line in click.get_text_stream('stdin') if line.strip()]
+        if not close_patterns:
+            return display('Provide at least one pattern or action id to close')
+        store = open_store(get_store_path(dev_tools_dir))
+        to_close = dict()
+        for close_pattern in close_patterns:
+            with phase('find actions'):
+                matches = find_actions(store, close_pattern)
+            if not matches:
+                display(f'Could not match an action to {close_pattern}')
+            elif len(matches) > 1:
+                display(f'The pattern {close_pattern} matched multiple actions')
+                [ display(f"{id+1:>5}: {action}") for id, action in enumerate(matches) ]
+            else:
+                to_close[matches[0]] = close_pattern
+        with phase('close actions'):
+            close_actions(store, to_close)
+        for action in to_close:
+            display(f'Closed {action}')
 
         is_successful = True
     except Exception as e:
         display("There was a failure.", "cyan")
+        record_error(e)
         exception_message = getattr(e, "message", repr(e))
     if not is_successful:
         error_message += exception_message
@@ -55,25 +94,34 @@ def close(close_pattern):
         display(error_message, "cyan")
 
 
-def actions():
+@cli.command()
+@click.option('--weeks', type=click.IntRange(min=1), default=8, help='Weeks of throughput to report, this week included.')
+@click.option('--by', 'dimension', type=click.Choice(['series', 'tag']), default='series', help='Split throughput by meeting series or by tag.')
+@click.option('--older-than', type=click.IntRange(min=0), default=None, help='Also count the open actions older than this many days.')
+@click.option('--format', 'output_format', type=click.Choice(['plain', 'json']), default='plain', help='Write the report as text or as a JSON object.')
+@click.option('--rebuild', is_flag=True, help='Count the report again from the event log.')
+def stats(weeks, dimension, older_than, output_format, rebuild):
+    # Reports on the actions as `actions` last recorded them, from aggregates
+    # kept up to date as each event is logged, so no history is read
     dev_tools_dir = Path.home() / '.dev-tools'
-    notes_dir = Path.home() / "Notes/"
 
     is_successful = False
     error_message = ''
     try:
-        actions_file_path = dev_tools_dir / 'dot-files'/ '.dtactions'
-        actions_file = initialise_actions_file(actions_file_path)
-        sub_files = notes_dir.glob('**/*.md')
-        all_actions = get_all_actions(sub_files)
-        actions_file['active'] = list(all_actions.difference(set(actions_file['closed'])))
-        with open(actions_file_path, 'w') as file:
-            json.dump(actions_file, file, indent=2)
-        for action in actions_file.get('active', list()):
-            display(action)
+        store = open_store(get_store_path(dev_tools_dir))
+        if rebuild:
+            with phase('rebuild aggregates'):
+                rebuild_aggregates(store)
+        with phase('read aggregates'):
+            report = get_stats_report(store, date.today(), weeks, dimension, older_than)
+        if output_format == 'json':
+            click.echo(json.dumps(report, indent=4))
+        else:
+            display_stats_report(report)
         is_successful = True
     except Exception as e:
         display("There was a failure.", "cyan")
+        record_error(e)
         exception_message = getattr(e, "message", repr(e))
     if not is_successful:
         error_message += exception_message
@@ -81,48 +129,362 @@ def actions():
             error_message = "An unknown error occurred"
         display(error_message, "cyan")
 
-def initialise_actions_file(file_path):
+
+def actions(
+    rebuild=False, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, since=None, until=None,
+    output_format='plain', stream=False, limit=None, sort='oldest',
+):
+    dev_tools_dir = Path.home() / '.dev-tools'
+    notes_dirs = get_notes_dirs(load_config(dev_tools_dir))
+
+    is_successful = False
+    error_message = ''
+    try:
+        since, until = get_date_range(since, until)
+        newest_first = sort == 'newest'
+        with phase('open store'):
+            store = open_store(get_store_path(dev_tools_dir))
+            # A --limit reads a few notes, their closed actions are looked up
+            # note by note, otherwise only those in the range being read
+            closed_actions = get_closed_actions(store, since=since, until=until) if limit is None else None
+        writer = ActionWriter(output_format)
+        # Without --stream nothing is written until the store is up to date
+        held_actions = list()
+        emit = writer.write if stream else lambda *action: held_actions.append(action)
+        all_actions = dict()
+        emitted = 0
+
+        with phase('daemon query'):
+            daemon_response = None if rebuild else daemon.query('actions')
+        if daemon_response:
+            notes = dict()
+            for action, note_path in daemon_response['actions'].items():
+                if in_date_range(action, since, until):
+                    notes.setdefault(note_path, {'actions': list()})['actions'].append(action)
+            for note_path, details in daemon_response.get('notes', dict()).items():
+                if note_path in notes:
+                    notes[note_path].update(details)
+            notes = sorted(notes.items(), key=lambda note: Path(note[0]).name, reverse=newest_first)
+        else:
+            scan_cache_path = dev_tools_dir / 'dot-files' / '.dtscancache'
+            with phase('load scan cache'):
+                scan_cache = initialise_scan_cache(scan_cache_path, rebuild=rebuild)
+            # A --limit is usually met within a few notes, so they are read one at a time
+            if limit is None:
+                with phase('glob and stat'):
+                    files = scan_roots(notes_dirs, since=since, until=until, reverse=newest_first)
+            else:
+                files = walk_roots_by_name(notes_dirs, since=since, until=until, reverse=newest_first)
+            notes = iter_cached_actions(
+                files, scan_cache, workers=workers, chunk_size=chunk_size, since=since, until=until, lazy=limit is not None
+                )
+
+        last_note = None
+        # The series and tags of notes with actions, which new actions are logged with
+        note_details = dict()
+        for note_path, entry in notes:
+            if entry['actions']:
+                note_details[note_path] = {'series': entry.get('series', ''), 'tags': entry.get('tags', list())}
+                if limit is not None:
+                    timestamp = re.match(TIMESTAMP_REGEX, Path(note_path).name).group(0)
+                    closed_actions = get_closed_actions(store, since=timestamp, until=f'{timestamp}~')
+            for action in entry['actions']:
+                if action in all_actions:
+                    continue
+                all_actions[action] = note_path
+                if action not in closed_actions and (limit is None or emitted < limit):
+                    emit(action, note_path)
+                    emitted += 1
+            if limit is not None and emitted >= limit:
+                last_note = note_path
+                break
+        if not daemon_response:
+            notes.close()
+            if scan_cache['changed']:
+                with phase('save scan cache'):
+                    save_scan_cache(scan_cache_path, scan_cache)
+        if last_note:
+            # Only notes up to the last one read were scanned, whether from the
+            # daemon or the notes, so later notes keep their open actions. Ties
+            # with its timestamp are kept too.
+            timestamp = re.match(TIMESTAMP_REGEX, Path(last_note).name).group(0)
+            since, until = (f'{timestamp}~', until) if newest_first else (since, timestamp)
+            # The last note is outside the narrowed range, its open actions
+            # would be missed by the sync and inserted again
+            all_actions = {
+                action: note_path for action, note_path in all_actions.items() if in_date_range(action, since, until)
+                }
+            note_details = {
+                note_path: details for note_path, details in note_details.items()
+                if in_date_range(Path(note_path).name, since, until)
+                }
+        # A root that can't be reached, like an unmounted network drive, scans
+        # as empty rather than as every one of its notes deleted
+        missing_dirs = [notes_dir for notes_dir in notes_dirs if not notes_dir.is_dir()]
+        with phase('sync store'):
+            sync_actions(store, all_actions, since=since, until=until, notes=note_details, missing_dirs=missing_dirs)
+        for action, note_path in held_actions:
+            writer.write(action, note_path)
+        writer.close()
+        is_successful = True
+    except Exception as e:
+        display("There was a failure.", "cyan")
+        record_error(e)
+        exception_message = getattr(e, "message", repr(e))
+    if not is_successful:
+        error_message += exception_message
+        if not error_message:
+            error_message = "An unknown error occurred"
+        display(error_message, "cyan")
+
+
+def get_stats_report(store, today, weeks, dimension='series', older_than=None):
+    # The open backlog by age, then throughput for each of the last `weeks`
+    # weeks and for each series or tag across them
+    ages = get_open_ages(store, today, AGE_BUCKETS)
+    lower_bounds = (0,) + tuple(days + 1 for days in AGE_BUCKETS)
+    labels = [f'{lower}-{upper} days' for lower, upper in zip(lower_bounds, AGE_BUCKETS)]
+    labels.append(f'over {AGE_BUCKETS[-1]} days')
+    report = {
+        'date': today.isoformat(),
+        'open': {'total': sum(ages), 'ages': dict(zip(labels, ages))},
+        'weeks': list(),
+        'by': dimension,
+        'totals': list(),
+        }
+    if older_than is not None:
+        cutoff = (today - timedelta(days=older_than)).isoformat()
+        report['open'][f'older than {older_than} days'] = get_open_count(store, '', cutoff)
+
+    since_week = get_week((today - timedelta(weeks=weeks - 1)).isoformat())
+    # Every event has a single series, so series add up to the week's totals
+    weekly = dict()
+    for week, _, *counts in get_weekly_totals(store, 'series', since_week):
+        weekly[week] = [total + value for total, value in zip(weekly.get(week, [0] * len(counts)), counts)]
+    report['weeks'] = [get_throughput({'week': week}, counts) for week, counts in weekly.items()]
+    named = dict()
+    for _, name, *counts in get_weekly_totals(store, dimension, since_week):
+        named[name] = [total + value for total, value in zip(named.get(name, [0] * len(counts)), counts)]
+    report['totals'] = sorted(
+        (get_throughput({'name': name}, counts) for name, counts in named.items()),
+        key=lambda totals: (-totals['opened'] - totals['closed'], totals['name']),
+        )
+    return report
+
+
+def get_throughput(record, counts):
+    opened, closed, carried, dropped, days_to_close = counts
+    record.update({
+        'opened': opened,
+        'closed': closed,
+        'carried': carried,
+        'dropped': dropped,
+        'close_rate': round(closed / opened, 3) if opened else None,
+        'mean_days_to_close': round(days_to_close / closed, 1) if closed else None,
+        })
+    return record
+
+
+def display_stats_report(report):
+    display('~~~ Open Actions ~~~', 'green')
+    for label, value in report['open']['ages'].items():
+        display(f'  - {label:<24}{value:>8}')
+    for label, value in report['open'].items():
+        if label not in ('total', 'ages'):
+            display(f'  - {label:<24}{value:>8}')
+    display(f"  - {'total':<24}{report['open']['total']:>8}")
+    columns = f"{'opened':>8}{'closed':>8}{'carried':>8}{'dropped':>8}{'closed %':>10}{'days':>8}"
+    display('~~~ Weekly Throughput ~~~', 'green')
+    display(f"    {'week':<24}{columns}", 'cyan')
+    for totals in report['weeks']:
+        display(f"  - {totals['week']:<24}{format_throughput(totals)}")
+    display(f"~~~ By {report['by'].title()} ~~~", 'green')
+    display(f"    {report['by']:<24}{columns}", 'cyan')
+    for totals in report['totals']:
+        display(f"  - {(totals['name'] or '(none)')[:23]:<24}{format_throughput(totals)}")
+
+
+def format_throughput(totals):
+    close_rate = f"{totals['close_rate']:.0%}" if totals['close_rate'] is not None else '-'
+    mean_days = f"{totals['mean_days_to_close']:.1f}" if totals['mean_days_to_close'] is not None else '-'
+    return (
+        f"{totals['opened']:>8}{totals['closed']:>8}{totals['carried']:>8}{totals['dropped']:>8}"
+        f"{close_rate:>10}{mean_days:>8}"
+        )
+
+
+class ActionWriter:
+    # Writes open actions as plain lines, one JSON object per line (ndjson) or
+    # a JSON array, flushing each one so a pipe sees it straight away.
+
+    def __init__(self, output_format='plain'):
+        self.output_format = output_format
+        self.written = 0
+
+    def write(self, action, note_path):
+        if self.output_format == 'plain':
+            display(action)
+        elif self.output_format == 'ndjson':
+            click.echo(json.dumps(get_action_record(action, note_path)))
+        else:
+            record = json.dumps(get_action_record(action, note_path))
+            click.echo(('[\n    ' if not self.written else ',\n    ') + record, nl=False)
+        self.written += 1
+
+    def close(self):
+        if self.output_format == 'json':
+            click.echo('\n]' if self.written else '[]')
+
+
+def get_action_record(action, note_path):
+    # '2024-01-01_09-00-00_0 | Do the thing' -> {'id': '2024-01-01_09-00-00_0',
+    # 'timestamp': '2024-01-01_09-00-00', 'index': 0, 'path': ..., 'text': 'Do the thing'}
+    _, action_id, text = split_action(action)
+    timestamp, _, index = action_id.rpartition('_')
+    return {'id': action_id, 'timestamp': timestamp, 'index': int(index), 'path': str(note_path), 'text': text}
+
+
+def initialise_scan_cache(file_path, rebuild=False):
+    # Remembers the actions of every note against its stat signature so that
+    # unchanged notes never need to be opened again.
+    scan_cache = {'version': SCAN_CACHE_VERSION, 'files': dict(), 'changed': rebuild}
+    if rebuild or not file_path.is_file():
+        return scan_cache
+    try:
+        with open(file_path, 'r') as file:
+            cached = json.load(file)
+    except ValueError:
+        scan_cache['changed'] = True
+        return scan_cache
+    if cached.get('version') != SCAN_CACHE_VERSION:
+        scan_cache['changed'] = True
+        return scan_cache
+    scan_cache['files'] = cached.get('files', dict())
+    return scan_cache
+
+
+def save_scan_cache(file_path, scan_cache):
     os.makedirs(file_path.parent, exist_ok=True)
-    if not file_path.is_file():
-        with open(file_path, 'w') as file:
-            file.write('{}')
-    with open(file_path, 'r') as file:
-        actions_file = json.load(file)
-    if not actions_file.get('closed'):
-        actions_file['closed'] = list()
-    if not actions_file.get('active'):
-        actions_file['active'] = list()
-    return actions_file
+    temp_path = file_path.with_name(f'{file_path.name}.{os.getpid()}.tmp')
+    with open(temp_path, 'w') as file:
+        json.dump({'version': scan_cache['version'], 'files': scan_cache['files']}, file)
+    os.replace(temp_path, file_path)
+    scan_cache['changed'] = False
 
 
-def get_all_actions(files):
-    return set(get_action_generator(files))
+def iter_cached_actions(files, scan_cache, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, since=None, until=None, lazy=False):
+    # Yields (note path, scan cache entry) for the timestamped notes of `files` in order,
+    # only reading notes whose stat signature has changed since the last scan.
+    # Every note is stat'ed up front and the stale ones are parsed across worker
+    # processes, or with `lazy` each note is stat'ed and parsed only when it is
+    # asked for so that stopping early skips the rest. `files` holds every note
+    # in the [since, until) range, mapped to its stat when already scanned, and
+    # the scan cache is updated once the caller stops asking.
+    cached_files = scan_cache['files']
+    fresh_files = dict()
+    finished = False
+    try:
+        if lazy:
+            for file in files:
+                entry = get_cache_entry(file, cached_files)
+                if entry is None:
+                    continue
+                if entry['actions'] is None:
+                    with phase('parse'):
+                        entry.update(get_note_actions(file))
+                fresh_files[str(file)] = entry
+                yield str(file), entry
+        else:
+            with phase('glob and stat'):
+                entries = [(file, get_cache_entry(file, cached_files, files[file])) for file in files]
+                entries = [(file, entry) for file, entry in entries if entry is not None]
+            stale_files = [file for file, entry in entries if entry['actions'] is None]
+            parsed = scan_files(get_note_actions, stale_files, workers=workers, chunk_size=chunk_size)
+            for file, entry in entries:
+                if entry['actions'] is None:
+                    with phase('parse'):
+                        entry.update(next(parsed)[1])
+                fresh_files[str(file)] = entry
+                yield str(file), entry
+        finished = True
+    finally:
+        update_scan_cache(scan_cache, fresh_files, since=since, until=until, finished=finished)
+
+
+def get_cache_entry(file, cached_files, stat=None):
+    # The cached entry of a note whose signature is unchanged, a new entry with
+    # no actions yet for one that needs reading, or None when it is not a note.
+    with phase('regex'):
+        is_note = re.match(TIMESTAMP_REGEX, file.stem)
+    if not is_note:
+        return None
+    if stat is None:
+        stat = stat_note(file)
+    count("files stat'ed")
+    signature = [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+    entry = cached_files.get(str(file))
+    if not entry or entry['signature'] != signature:
+        entry = {'signature': signature, 'actions': None}
+    return entry
+
+
+def update_scan_cache(scan_cache, fresh_files, since=None, until=None, finished=True):
+    # Notes outside the [since, until) range, or not reached by a scan that
+    # stopped early, keep their entries. The rest are replaced by `fresh_files`.
+    cached_files = scan_cache['files']
+    if finished:
+        kept_files = {
+            path: entry
+            for path, entry in cached_files.items()
+            if not in_date_range(os.path.basename(path), since, until)
+            }
+    else:
+        kept_files = {path: entry for path, entry in cached_files.items() if path not in fresh_files}
+    if len(kept_files) + len(fresh_files) != len(cached_files) or any(
+        entry is not cached_files.get(path) for path, entry in fresh_files.items()
+    ):
+        # Notes have been edited, added or deleted since the last scan
+        scan_cache['changed'] = True
+    scan_cache['files'] = {**kept_files, **fresh_files}
+
+
+def get_all_actions(files, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    return list(dict.fromkeys(get_action_generator(files, workers=workers, chunk_size=chunk_size)))
 
 
-def get_action_generator(files):
-    for file in files:
-        file_actions = get_actions(file)
+def get_action_generator(files, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    for file, file_actions in scan_files(get_actions, files, workers=workers, chunk_size=chunk_size):
         for action in file_actions:
             yield action
 
 
 def get_actions(file):
-    ts_regex = r'^[0-9]{4}-[0-9]{2}-[0-9]{2}_[0-9]{2}-[0-9]{2}-[0-9]{2}'
-    if not re.match(ts_regex, file.stem):
+    if not re.match(TIMESTAMP_REGEX, file.stem):
         return list()
-    with open(file, 'r') as file_reader:
-        file_contents = ''.join(file_reader.readlines())
-    timestamp = re.match(f"({ts_regex})", file.stem).group(1)
-    actions_regex = r'(?<=### Actions\n)(.*\n)*(?=\n### Tags)'
-    actions = re.search(actions_regex, file_contents)
+    return format_actions(file, read_sections(file, wanted=('### Actions',)))
+
+
+def get_note_actions(file):
+    # The actions of a note, with the series and tags they are logged with when
+    # it has any: {'actions': [...], 'series': 'Sync', 'tags': ['alpha']}
+    if not re.match(TIMESTAMP_REGEX, file.stem):
+        return {'actions': list()}
+    title, sections = read_titled_sections(file, wanted=('### Actions', '### Tags'))
+    actions = format_actions(file, sections)
     if not actions:
-        return list()
-    actions = actions.group(1)
-    actions = [
-        re.match('- (.+)', action_line).group(1)
-        for action_line in actions.split('\n')
-        if re.match('- (.+)', action_line)
-        ]
+        return {'actions': actions}
+    return {'actions': actions, **get_note_details(sections, get_series(str(file), title))}
+
+
+def get_note_details(sections, series):
+    # Tags are written both as '#alpha' and 'alpha'
+    tags = [tag.strip().lstrip('#').strip() for tag in get_list_items(sections.get('### Tags', ''))]
+    return {'series': series, 'tags': [tag for tag in tags if tag]}
+
+
+def format_actions(file, sections):
+    timestamp = re.match(f"({TIMESTAMP_REGEX})", file.stem).group(1)
+    actions = get_list_items(sections.get('### Actions', ''))
     actions = [f"{timestamp}_{action_id} | {action}" for action_id, action in enumerate(actions)]
     return actions
 
@@ -0,0 +1,159 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# Packs closed years of notes into compressed archives that are read in place.
+
+import io
+import json
+import os
+
+from datetime import date
+from pathlib import Path
+
+from dev_tools.instrument import count
+
+ARCHIVE_SUFFIX = '.notes.zip'
+# The index lists the archive's notes, the sections member holds the sections
+# commands scan every note for, so scanning an archive reads one member
+# instead of every note in it and listing it reads a smaller one still.
+INDEX_MEMBER = '.dtindex.json'
+SECTIONS_MEMBER = '.dtsections.json'
+INDEX_VERSION = 1
+INDEXED_SECTIONS = ('### Tags', '### Attendees', '### Decisions', '### Actions')
+
+# The archives this process has opened, by path
+open_archives = dict()
+
+
+def get_archive_path(notes_dir, year):
+    return notes_dir / f'{year}{ARCHIVE_SUFFIX}'
+
+
+def split_archived_path(path):
+    # Archived notes are addressed as if their archive were a folder, e.g.
+    #   ~/Notes/2023.notes.zip/2023/01-January/02-Monday/2023-01-02_09-00-00.md
+    # Returns (archive path, member name), or None for a note in the live tree.
+    path = str(path)
+    position = path.find(ARCHIVE_SUFFIX + os.sep)
+    if position < 0:
+        return None
+    end = position + len(ARCHIVE_SUFFIX)
+    return path[:end], path[end + 1:].replace(os.sep, '/')
+
+
+def load_archive(archive_path):
+    # Returns {'archive': zip file, 'notes': member names, 'sections': None
+    # until read_indexed_sections needs them}, reopened when the archive changes.
+    # Only imported here, most runs never touch an archive
+    import zipfile
+
+    stat = os.stat(archive_path)
+    signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    loaded = open_archives.get(str(archive_path))
+    if loaded and loaded['signature'] == signature:
+        return loaded
+    if loaded:
+        loaded['archive'].close()
+    archive = zipfile.ZipFile(archive_path)
+    index = json.loads(archive.read(INDEX_MEMBER))
+    if index.get('version') != INDEX_VERSION:
+        archive.close()
+        raise Exception(f'{archive_path} has an index this version of dev-tools cannot read')
+    loaded = {'signature': signature, 'archive': archive, 'notes': index['notes'], 'sections': None}
+    open_archives[str(archive_path)] = loaded
+    count('archives opened')
+    return loaded
+
+
+def list_archived_notes(archive_path):
+    # The archive's notes in path order, read from its index
+    notes = load_archive(archive_path)['notes']
+    return [Path(f'{archive_path}{os.sep}{member}') for member in notes]
+
+
+def open_note(path, encoding=None, errors=None):
+    # Opens a note for reading as text, from its archive when it has one
+    archived = split_archived_path(path)
+    if not archived:
+        return open(path, 'r', encoding=encoding, errors=errors)
+    archive = load_archive(archived[0])['archive']
+    return io.TextIOWrapper(archive.open(archived[1]), encoding=encoding, errors=errors)
+
+
+def stat_note(path):
+    # Archived notes share the stat of their archive, they change when it does
+    archived = split_archived_path(path)
+    return os.stat(archived[0] if archived else path)
+
+
+def read_indexed_sections(path, wanted=None):
+    # The wanted sections of an archived note, from its archive's index. None
+    # when the note is live or a wanted section is not kept in the index.
+    if not wanted or not set(wanted).issubset(INDEXED_SECTIONS):
+        return None
+    archived = split_archived_path(path)
+    if not archived:
+        return None
+    loaded = load_archive(archived[0])
+    if loaded['sections'] is None:
+        loaded['sections'] = json.loads(loaded['archive'].read(SECTIONS_MEMBER))
+    sections = loaded['sections'][archived[1]]
+    return {heading: sections[heading] for heading in wanted if heading in sections}
+
+
+def archive_year(notes_dir, year):
+    # Packs every file under notes_dir/<year> into <year>.notes.zip, together
+    # with anything archived for the year before, and deletes the packed files
+    # once the archive has been written and checked. Members keep their path
+    # relative to `notes_dir`. Returns the number of notes and files packed and
+    # the bytes before and after.
+    import zipfile
+    from dev_tools.sections import read_sections
+
+    if year >= date.today().year:
+        raise Exception(f'{year} has not ended yet, only past years can be archived')
+    year_dir = notes_dir / str(year)
+    files = sorted(path for path in year_dir.rglob('*') if path.is_file()) if year_dir.is_dir() else list()
+    if not files:
+        raise Exception(f'There are no notes in {year_dir} to archive')
+    archive_path = get_archive_path(notes_dir, year)
+    members = {path.relative_to(notes_dir).as_posix(): path for path in files}
+    sections = dict()
+    unpacked_size = sum(os.stat(path).st_size for path in files)
+
+    temp_path = archive_path.with_name(f'{archive_path.name}.{os.getpid()}.tmp')
+    try:
+        with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as packed:
+            if archive_path.is_file():
+                # Files written back into an archived year replace their old copy
+                with zipfile.ZipFile(archive_path) as earlier:
+                    earlier_sections = json.loads(earlier.read(SECTIONS_MEMBER))
+                    for info in earlier.infolist():
+                        if info.filename in (INDEX_MEMBER, SECTIONS_MEMBER) or info.filename in members:
+                            continue
+                        packed.writestr(info, earlier.read(info))
+                        if info.filename in earlier_sections:
+                            sections[info.filename] = earlier_sections[info.filename]
+            for member, path in members.items():
+                packed.write(path, member)
+                if path.suffix == '.md':
+                    sections[member] = read_sections(path, wanted=INDEXED_SECTIONS)
+            sections = dict(sorted(sections.items()))
+            packed.writestr(INDEX_MEMBER, json.dumps({'version': INDEX_VERSION, 'year': year, 'notes': list(sections)}))
+            packed.writestr(SECTIONS_MEMBER, json.dumps(sections))
+        with zipfile.ZipFile(temp_path) as packed:
+            broken = packed.testzip()
+            if broken:
+                raise Exception(f'{broken} was not archived correctly')
+        os.replace(temp_path, archive_path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+    for path in files:
+        path.unlink()
+    # Folders that gained a file while packing are left in place
+    for directory in sorted((path for path in year_dir.rglob('*') if path.is_dir()), reverse=True):
+        if not any(directory.iterdir()):
+            directory.rmdir()
+    if not any(year_dir.iterdir()):
+        year_dir.rmdir()
+    return len(sections), len(files), unpacked_size, os.stat(archive_path).st_size
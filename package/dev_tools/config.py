@@ -0,0 +1,72 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# Shared access to the local `.dtconfig` configuration file.
+
+import os
+
+from pathlib import Path
+
+
+def load_config(dev_tools_dir=None):
+    dev_tools_dir = dev_tools_dir or Path.home() / '.dev-tools'
+    config_path = dev_tools_dir / 'dot-files' / '.dtconfig'
+    if not config_path.is_file():
+        return dict()
+    # Only imported here, it is slow to import and --help never reads the config
+    import tomllib
+
+    with open(config_path, 'rb') as file:
+        contents = file.read()
+    try:
+        return tomllib.loads(contents.decode('utf-8'))
+    except tomllib.TOMLDecodeError:
+        return parse_simple_config(contents.decode('utf-8'))
+
+
+def parse_simple_config(contents):
+    # The same `name = value` format the PowerShell `Load-Config` function reads
+    config = dict()
+    for line in contents.splitlines():
+        if not line.strip() or line.lstrip().startswith('#') or '=' not in line:
+            continue
+        name, value = line.split('=', 1)
+        config[name.strip().strip('"')] = value.strip().strip('"')
+    return config
+
+
+def get_config_value(config, key, default=None):
+    # The template config marks fields still to be filled in with "None"
+    value = config.get(key)
+    if value is None or value in ('', 'None'):
+        return default
+    return value
+
+
+def get_config_path(config, key, default):
+    value = get_config_value(config, key)
+    return Path(value).expanduser() if value else default
+
+
+def get_config_list(config, key, default=()):
+    # TOML arrays, or a comma separated string from the simple format
+    value = get_config_value(config, key)
+    if value is None:
+        return list(default)
+    if isinstance(value, str):
+        value = [item.strip().strip('"\'') for item in value.strip('[]').split(',')]
+    return [item for item in value if item not in ('', 'None')]
+
+
+def get_notes_dirs(config):
+    # The notes root new notes are written to, followed by any shared roots,
+    # e.g. a team folder synced from a network drive. A root that is an earlier
+    # one is skipped, roots holding another are kept and walking them keeps a
+    # single copy of each note.
+    notes_dirs = [get_config_path(config, 'notes_dir', Path.home() / 'Notes')]
+    notes_dirs += [Path(value).expanduser() for value in get_config_list(config, 'shared_notes_dirs')]
+    kept_dirs = dict()
+    for notes_dir in notes_dirs:
+        resolved = Path(os.path.realpath(notes_dir))
+        if resolved in kept_dirs.values():
+            continue
+        kept_dirs[notes_dir] = resolved
+    return list(kept_dirs)
@@ -0,0 +1,301 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A background process that keeps the notes index hot and answers queries over a unix socket.
+
+import click
+import json
+import os
+import re
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+
+from pathlib import Path
+
+from dev_tools.instrument import profiled
+
+SOCKET_NAME = '.daemon.sock'
+POLL_INTERVAL = 2.0
+CLIENT_TIMEOUT = 0.5
+# A daemon answers from memory, one that takes longer than this is stuck
+CLIENT_READ_TIMEOUT = 10.0
+
+
+@click.group()
+@profiled('daemon')
+def cli():
+    pass
+
+
+@cli.command()
+@click.option('--background', is_flag=True, help='Detach from the terminal.')
+@click.option('--poll-interval', type=float, default=POLL_INTERVAL, help='Seconds between rescans when file events are unavailable.')
+def start(background, poll_interval):
+    from dev_tools.config import load_config, get_notes_dirs
+
+    dev_tools_dir = Path.home() / '.dev-tools'
+    notes_dirs = get_notes_dirs(load_config(dev_tools_dir))
+    socket_path = get_socket_path(dev_tools_dir)
+
+    if not hasattr(socket, 'AF_UNIX'):
+        return display('The daemon needs unix domain sockets, which this platform does not support.', 'cyan')
+    if query('ping', socket_path=socket_path):
+        return display('The daemon is already running.')
+    if background:
+        subprocess.Popen(
+            [sys.executable, '-m', 'dev_tools.daemon', 'start', '--poll-interval', str(poll_interval)],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+            )
+        return display('Daemon started.', 'bright_green')
+    serve(notes_dirs, socket_path, poll_interval=poll_interval)
+
+
+@cli.command()
+def stop():
+    socket_path = get_socket_path(Path.home() / '.dev-tools')
+    if query('stop', socket_path=socket_path) is None:
+        return display('The daemon is not running.')
+    display('Daemon stopped.', 'bright_green')
+
+
+@cli.command()
+def status():
+    response = query('status', socket_path=get_socket_path(Path.home() / '.dev-tools'))
+    if response is None:
+        return display('The daemon is not running.')
+    display(f"Watching {', '.join(response['notes_dirs'])} ({response['watcher']})")
+    display(f"{response['notes']} notes indexed, {response['actions']} actions")
+
+
+class NotesIndex:
+    # The parsed sections and actions of every timestamped note in every notes
+    # root, refreshed from stat signatures so only changed notes are re-read.
+
+    def __init__(self, notes_dirs):
+        self.notes_dirs = notes_dirs
+        self.notes = dict()
+        self.lock = threading.Lock()
+
+    def refresh(self, paths=None):
+        from dev_tools.actions import TIMESTAMP_REGEX, format_actions, get_note_details
+        from dev_tools.archive import stat_note
+        from dev_tools.sections import read_sections
+        from dev_tools.store import get_series
+        from dev_tools.walk import scan_roots
+
+        if paths is None:
+            stats = scan_roots(self.notes_dirs)
+            paths = list(stats)
+            removed_paths = set(self.notes).difference(str(path) for path in paths)
+        else:
+            stats = dict()
+            removed_paths = set()
+        updates = dict()
+        for path in paths:
+            path = Path(path)
+            if path.suffix != '.md' or not re.match(TIMESTAMP_REGEX, path.stem):
+                continue
+            if path not in stats and self.is_shadowed(path):
+                continue
+            try:
+                stat = stats.get(path) or stat_note(path)
+                signature = [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+                entry = self.notes.get(str(path))
+                if entry and entry['signature'] == signature:
+                    continue
+                sections = read_sections(path)
+            except FileNotFoundError:
+                removed_paths.add(str(path))
+                continue
+            title = next((heading for heading in sections if heading.startswith('# ')), '')
+            updates[str(path)] = {
+                'signature': signature,
+                'sections': sections,
+                'actions': format_actions(path, sections),
+                **get_note_details(sections, get_series(str(path), title)),
+                }
+        with self.lock:
+            for path in removed_paths:
+                self.notes.pop(path, None)
+            self.notes.update(updates)
+
+    def is_shadowed(self, path):
+        # Whether a root before the note's own holds the same note, the copy a
+        # full rescan keeps
+        own_root = next((root for root in self.notes_dirs if root in path.parents), None)
+        if own_root is None:
+            return False
+        relative_path = path.relative_to(own_root)
+        earlier_roots = self.notes_dirs[:self.notes_dirs.index(own_root)]
+        return any((root / relative_path).is_file() for root in earlier_roots)
+
+    def get_actions(self):
+        with self.lock:
+            return {
+                action: note_path
+                for note_path, entry in self.notes.items()
+                for action in entry['actions']
+                }
+
+    def get_note_details(self):
+        # The series and tags of every note with actions
+        with self.lock:
+            return {
+                note_path: {'series': entry['series'], 'tags': entry['tags']}
+                for note_path, entry in self.notes.items()
+                if entry['actions']
+                }
+
+    def get_sections(self, path):
+        with self.lock:
+            entry = self.notes.get(str(path))
+            return entry['sections'] if entry else None
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        request = json.loads(self.rfile.readline() or '{}')
+        server = self.server
+        command = request.get('command')
+        if command == 'ping':
+            response = {'ok': True}
+        elif command == 'status':
+            response = {
+                'notes_dirs': [str(notes_dir) for notes_dir in server.index.notes_dirs],
+                'watcher': server.watcher,
+                'notes': len(server.index.notes),
+                'actions': len(server.index.get_actions()),
+                }
+        elif command == 'actions':
+            response = {'actions': server.index.get_actions(), 'notes': server.index.get_note_details()}
+        elif command == 'notes':
+            with server.index.lock:
+                response = {'notes': list(server.index.notes)}
+        elif command == 'sections':
+            response = {'sections': server.index.get_sections(request.get('path'))}
+        elif command == 'stop':
+            response = {'ok': True}
+            threading.Thread(target=server.shutdown, daemon=True).start()
+        else:
+            response = {'error': f'Unknown command {command}'}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class NotesServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(notes_dirs, socket_path, poll_interval=POLL_INTERVAL):
+    os.makedirs(notes_dirs[0], exist_ok=True)
+    index = NotesIndex(notes_dirs)
+    index.refresh()
+
+    changed_paths = set()
+    changed_lock = threading.Lock()
+    changed = threading.Event()
+    stopped = threading.Event()
+    watcher = start_watcher(notes_dirs, changed_paths, changed_lock, changed)
+
+    def refresh_loop():
+        while not stopped.is_set():
+            if watcher:
+                changed.wait()
+                changed.clear()
+                with changed_lock:
+                    paths = list(changed_paths)
+                    changed_paths.clear()
+                # A None path asks for a full rescan
+                index.refresh(None if None in paths else paths)
+            else:
+                stopped.wait(poll_interval)
+                index.refresh()
+
+    threading.Thread(target=refresh_loop, daemon=True).start()
+
+    if socket_path.exists():
+        os.remove(socket_path)
+    with NotesServer(str(socket_path), RequestHandler) as server:
+        server.index = index
+        server.watcher = 'inotify' if watcher else f'polling every {poll_interval}s'
+        os.chmod(socket_path, 0o600)
+        display(f"Serving {', '.join(str(notes_dir) for notes_dir in notes_dirs)} on {socket_path}", 'green')
+        try:
+            server.serve_forever()
+        finally:
+            stopped.set()
+            changed.set()
+            if watcher:
+                watcher.stop()
+            if socket_path.exists():
+                os.remove(socket_path)
+
+
+def start_watcher(notes_dirs, changed_paths, changed_lock, changed):
+    # Uses file system events (inotify on linux) through the optional `watchdog`
+    # package, returning None so the caller falls back to polling when it is missing.
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    class NotesEventHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            with changed_lock:
+                if event.is_directory:
+                    # Folder moves and deletes need a full rescan
+                    changed_paths.add(None)
+                else:
+                    changed_paths.add(event.src_path)
+                    if getattr(event, 'dest_path', ''):
+                        changed_paths.add(event.dest_path)
+            changed.set()
+
+    observer = Observer()
+    for notes_dir in notes_dirs:
+        # A shared root whose drive is not mounted can't be watched
+        if notes_dir.is_dir():
+            observer.schedule(NotesEventHandler(), str(notes_dir), recursive=True)
+    observer.start()
+    return observer
+
+
+def get_socket_path(dev_tools_dir):
+    return dev_tools_dir / SOCKET_NAME
+
+
+def query(command, socket_path=None, **arguments):
+    # Asks a running daemon, returning None when there is no daemon to ask
+    # so every caller can fall back to doing the work in-process.
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    socket_path = socket_path or get_socket_path(Path.home() / '.dev-tools')
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(CLIENT_TIMEOUT)
+            client.connect(str(socket_path))
+            client.sendall(json.dumps({'command': command, **arguments}).encode('utf-8') + b'\n')
+            # A stuck daemon times out the read and the caller does the work itself
+            client.settimeout(CLIENT_READ_TIMEOUT)
+            with client.makefile('rb') as reader:
+                response = json.loads(reader.readline() or 'null')
+    except (OSError, ValueError):
+        return None
+    if not response or 'error' in response:
+        return None
+    return response
+
+
+def display(message, color="bright_cyan"):
+    click.echo(click.style(message, fg=color))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,274 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A command to delete temporary environments created by newenv.
+
+import click
+import fnmatch
+import os
+import subprocess
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from uuid import uuid4
+
+from dev_tools.config import load_config, get_config_path
+from dev_tools.instrument import profiled, phase, count, record_error
+from dev_tools.newenv import POOL_DIR_NAME
+
+ENV_PATTERN = 'project_*'
+TRASH_DIR_NAME = '.dev-tools-trash'
+DELETE_WORKERS = 8
+
+@click.command()
+@click.argument('env_names', nargs=-1)
+@click.option('--all', 'delete_all', is_flag=True, help='Delete every environment.')
+@click.option('--pattern', default=None, help=f'Delete every environment whose name matches a glob, defaults to {ENV_PATTERN}.')
+@click.option('--older-than', type=float, default=None, help='Only delete environments untouched for this many days.')
+@click.option('--workers', type=int, default=DELETE_WORKERS, help='Number of threads removing files.')
+@click.option('--trash', is_flag=True, help='Move environments to a trash folder and delete them in the background.')
+@click.option('--purge-trash', is_flag=True, help='Delete everything in the trash folders.')
+@click.option('--yes', is_flag=True, help='Delete every matching environment without asking first.')
+@profiled('delenv')
+def cli(env_names, delete_all, pattern, older_than, workers, trash, purge_trash, yes):
+    if purge_trash:
+        purge_environments(workers)
+    else:
+        delete_environments(env_names, delete_all, pattern, older_than, workers, trash, yes)
+
+def delete_environments(env_names=(), delete_all=False, pattern=None, older_than=None, workers=DELETE_WORKERS, trash=False, yes=False):
+    is_successful = False
+    error_message = ''
+    env_dirs = get_env_dirs()
+
+    try:
+        is_bulk = not env_names and (delete_all or pattern or older_than is not None)
+        if env_names:
+            env_paths = [find_environment(env_dirs, env_name) for env_name in env_names]
+        elif is_bulk:
+            env_paths = match_environments(env_dirs, pattern or ENV_PATTERN)
+        else:
+            env_paths = [get_current_environment(env_dirs)]
+        env_paths = [env_path for env_path in env_paths if env_path]
+        if older_than is not None:
+            env_paths = [env_path for env_path in env_paths if get_age(env_path) > older_than * 24 * 60 * 60]
+        if not env_paths:
+            raise Exception('No environment to delete')
+        if is_bulk and not yes and not confirm_environments(env_paths):
+            display('Nothing was deleted.', 'yellow')
+            return
+
+        leave_environments(env_paths)
+        if trash:
+            for env_path in env_paths:
+                display(f'  - Moving {env_path} to the trash...')
+                move_to_trash(env_path)
+            # Deleting the files is left to a detached process
+            subprocess.Popen(
+                [sys.executable, '-m', 'dev_tools.delenv', '--purge-trash', '--workers', str(workers)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        else:
+            for env_path in env_paths:
+                display(f'  - Deleting {env_path}...')
+            display_reclaimed(remove_trees(env_paths, workers))
+        is_successful = True
+    except Exception as e:
+        display('There was a failure.', 'cyan')
+        record_error(e)
+        exception_message = getattr(e, 'message', repr(e))
+    if is_successful:
+        display('Done!', 'bright_green')
+    else:
+        error_message += exception_message
+        if not error_message:
+            error_message = 'An unknown error occurred'
+        display(error_message, 'cyan')
+
+def purge_environments(workers=DELETE_WORKERS):
+    is_successful = False
+    error_message = ''
+
+    try:
+        trash_paths = list()
+        for env_dir in get_env_dirs():
+            trash_dir = env_dir / TRASH_DIR_NAME
+            if trash_dir.is_dir():
+                trash_paths += sorted(trash_dir.iterdir())
+        display(f'  - Emptying {len(trash_paths)} environments from the trash...')
+        display_reclaimed(remove_trees(trash_paths, workers))
+        is_successful = True
+    except Exception as e:
+        display('There was a failure.', 'cyan')
+        record_error(e)
+        exception_message = getattr(e, 'message', repr(e))
+    if is_successful:
+        display('Done!', 'bright_green')
+    else:
+        error_message += exception_message
+        if not error_message:
+            error_message = 'An unknown error occurred'
+        display(error_message, 'cyan')
+
+def get_env_dirs():
+    config = load_config()
+    env_dirs = [
+        get_config_path(config, 'development_dir', Path.home() / 'development/'),
+        get_config_path(config, 'playground_dir', Path.home() / 'playground/'),
+    ]
+    return [env_dir for env_dir in env_dirs if env_dir.is_dir()]
+
+def find_environment(env_dirs, env_name):
+    # An environment number is short for its `project_<n>` folder
+    if env_name.isdigit():
+        env_name = f'project_{env_name}'
+    # Only a folder directly inside an environment directory is deleted, never
+    # the directory itself, a path out of it or the pool and trash kept in it
+    if not is_environment_name(env_name):
+        display(f'{env_name} is not an environment name', 'red')
+        return None
+    # A linked environment is found as the link, which is all that is deleted
+    env_paths = [
+        env_dir / env_name
+        for env_dir in env_dirs
+        if (env_dir / env_name).is_symlink() or (env_dir / env_name).is_dir()
+    ]
+    if not env_paths:
+        display(f'Could not find {env_name}', 'red')
+        return None
+    if len(env_paths) == 1:
+        return env_paths[0]
+    display('Two environments under this id:', 'yellow')
+    for i, env_path in enumerate(env_paths):
+        display(f'[{i}] - {env_path}', 'yellow')
+    return env_paths[click.prompt('Select which environment to delete', type=click.IntRange(0, len(env_paths) - 1))]
+
+def match_environments(env_dirs, pattern):
+    env_paths = list()
+    for env_dir in env_dirs:
+        with os.scandir(env_dir) as entries:
+            for entry in entries:
+                if (
+                    entry.is_dir(follow_symlinks=False)
+                    and is_environment_name(entry.name)
+                    and fnmatch.fnmatch(entry.name, pattern)
+                ):
+                    env_paths.append(Path(entry.path))
+    return sorted(env_paths)
+
+def is_environment_name(env_name):
+    return (
+        env_name not in ('', os.curdir, os.pardir, POOL_DIR_NAME, TRASH_DIR_NAME)
+        and os.sep not in env_name
+        and not (os.altsep and os.altsep in env_name)
+    )
+
+def get_current_environment(env_dirs):
+    # Only a folder newenv created is deleted from inside it, not any project
+    # that happens to live in the development directory
+    cwd = Path.cwd()
+    for env_dir in env_dirs:
+        if env_dir in cwd.parents:
+            env_name = cwd.relative_to(env_dir).parts[0]
+            if is_environment_name(env_name) and fnmatch.fnmatch(env_name, ENV_PATTERN):
+                return env_dir / env_name
+    return None
+
+def confirm_environments(env_paths):
+    display(f'About to delete {len(env_paths)} environments:', 'yellow')
+    for env_path in env_paths:
+        display(f'  - {env_path}', 'yellow')
+    return click.confirm('Delete them?', default=False)
+
+def get_age(env_path):
+    return time.time() - os.lstat(env_path).st_mtime
+
+def leave_environments(env_paths):
+    # A folder can't be removed from under a shell on every platform
+    cwd = Path.cwd()
+    if any(cwd == env_path or env_path in cwd.parents for env_path in env_paths):
+        os.chdir(Path.home())
+
+def move_to_trash(env_path):
+    # The trash sits next to the environment so moving it is a single rename
+    trash_dir = env_path.parent / TRASH_DIR_NAME
+    os.makedirs(trash_dir, exist_ok=True)
+    trash_path = trash_dir / f'{env_path.name}.{uuid4().hex[:8]}'
+    os.rename(env_path, trash_path)
+    return trash_path
+
+def remove_trees(paths, workers=DELETE_WORKERS):
+    # Every directory's files are unlinked on a thread pool, then the emptied
+    # directories are removed deepest first. Returns the bytes and inodes that
+    # were freed. Files still hard linked elsewhere, like those a venv shares
+    # with its seed, free nothing. A path that is a link is unlinked itself and
+    # never followed.
+    directories = list()
+    links = list()
+    with phase('list directories'):
+        for path in paths:
+            if os.path.islink(path):
+                links.append(path)
+            else:
+                directories += list_directories(path)
+    with phase('unlink files'), ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(unlink_files, directories))
+    reclaimed_bytes = sum(result[0] for result in results)
+    reclaimed_inodes = sum(result[1] for result in results)
+    with phase('remove directories'):
+        for directory, _ in reversed(directories):
+            os.rmdir(directory)
+            reclaimed_inodes += 1
+        for link in links:
+            os.unlink(link)
+            reclaimed_inodes += 1
+    count('files deleted', sum(len(files) for _, files in directories))
+    count('bytes reclaimed', reclaimed_bytes)
+    return reclaimed_bytes, reclaimed_inodes
+
+def list_directories(path):
+    # Returns (directory, entries to unlink) parents first, without following symlinks
+    directories = list()
+    pending = [str(path)]
+    while pending:
+        directory = pending.pop()
+        files = list()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                else:
+                    files.append(entry.path)
+        directories.append((directory, files))
+    return directories
+
+def unlink_files(directory):
+    reclaimed_bytes = 0
+    reclaimed_inodes = 0
+    for path in directory[1]:
+        stat = os.lstat(path)
+        os.unlink(path)
+        if stat.st_nlink == 1:
+            reclaimed_bytes += stat.st_size
+            reclaimed_inodes += 1
+    return reclaimed_bytes, reclaimed_inodes
+
+def display_reclaimed(reclaimed):
+    reclaimed_bytes, reclaimed_inodes = reclaimed
+    display(f'  - Reclaimed {format_size(reclaimed_bytes)} and {reclaimed_inodes} inodes')
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{size} {unit}'
+        size /= 1024
+    return f'{size:.1f} TB'
+
+def display(message, color='bright_cyan'):
+    click.echo(click.style(message, fg=color))
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,52 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A single `dev-tools` command that runs every other command as a subcommand.
+
+import click
+
+from importlib import import_module
+
+# Subcommands are only imported when they are run, so `dev-tools --help` and
+# each command only pay for the modules they use.
+COMMANDS = {
+    'actions': ('dev_tools.actions:cli', 'List, sync and close actions from notes.'),
+    'daemon': ('dev_tools.daemon:cli', 'Keep the notes index hot in a background process.'),
+    'delenv': ('dev_tools.delenv:cli', 'Delete environments created by newenv.'),
+    'meeting': ('dev_tools.meeting:cli', 'Create meeting, daily and KIT notes.'),
+    'newenv': ('dev_tools.newenv:cli', 'Create a new development environment.'),
+    'notes': ('dev_tools.notes:cli', 'Search and maintain the notes tree.'),
+    'title': ('dev_tools.title:cli', 'Rename notes after their titles.'),
+}
+
+
+class LazyGroup(click.Group):
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or dict()
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, name):
+        command = super().get_command(ctx, name)
+        if command is None and name in self.lazy_commands:
+            module_name, attribute = self.lazy_commands[name][0].split(':')
+            command = getattr(import_module(module_name), attribute)
+            self.add_command(command, name)
+        return command
+
+    def format_commands(self, ctx, formatter):
+        # Listing a command's help would otherwise import it
+        rows = [(name, self.lazy_commands[name][1]) for name in self.list_commands(ctx) if name not in self.commands]
+        rows += [(name, command.get_short_help_str()) for name, command in self.commands.items()]
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(sorted(rows))
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
+def cli():
+    pass
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,130 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A SQLite store of the list sections of notes, for indexed queries across tags, attendees and dates.
+
+import re
+
+from dev_tools.scan import DEFAULT_CHUNK_SIZE
+from dev_tools.sections import read_sections, get_list_items
+from dev_tools.sidecar import open_sidecar, update_sidecar
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    note_id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    signature TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notes_by_timestamp ON notes (timestamp);
+CREATE TABLE IF NOT EXISTS items (
+    note_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    normalised TEXT NOT NULL,
+    PRIMARY KEY (note_id, kind, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS items_by_value ON items (kind, normalised, note_id);
+"""
+SCHEMA_VERSION = 1
+
+TIMESTAMP_REGEX = re.compile(r'^[0-9]{4}-[0-9]{2}-[0-9]{2}_[0-9]{2}-[0-9]{2}-[0-9]{2}')
+FACET_SECTIONS = {
+    '### Tags': 'tag',
+    '### Attendees': 'attendee',
+    '### Decisions': 'decision',
+    '### Actions': 'action',
+}
+FACET_KINDS = tuple(FACET_SECTIONS.values())
+
+
+def get_facets_path(dev_tools_dir):
+    return dev_tools_dir / 'dot-files' / '.dtfacets.db'
+
+
+def open_facets(file_path, rebuild=False):
+    return open_sidecar(file_path, SCHEMA, SCHEMA_VERSION, ('notes', 'items'), rebuild=rebuild)
+
+
+def update_facets(connection, files, stats=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Only notes named after their timestamp are kept. Returns the number of
+    # notes updated and removed.
+    return update_sidecar(
+        connection, files, get_note_facets, insert_note, delete_note,
+        stats=stats, workers=workers, chunk_size=chunk_size, include=is_note,
+        )
+
+
+def is_note(file):
+    return TIMESTAMP_REGEX.match(file.stem)
+
+
+def insert_note(connection, file, signature, facets):
+    note_id = connection.execute(
+        'INSERT INTO notes (path, signature, timestamp) VALUES (?, ?, ?)',
+        (str(file), signature, TIMESTAMP_REGEX.match(file.stem).group(0)),
+        ).lastrowid
+    connection.executemany(
+        'INSERT INTO items (note_id, kind, position, value, normalised) VALUES (?, ?, ?, ?, ?)',
+        (
+            (note_id, kind, position, value, normalise(value))
+            for kind, values in facets.items()
+            for position, value in enumerate(values)
+            ),
+        )
+
+
+def delete_note(connection, note_id):
+    connection.execute('DELETE FROM items WHERE note_id = ?', (note_id,))
+    connection.execute('DELETE FROM notes WHERE note_id = ?', (note_id,))
+
+
+def query_items(connection, kind, tags=(), attendees=(), since=None, until=None):
+    # Returns (note path, timestamp, value) for every `kind` item of the notes
+    # carrying all of `tags` and `attendees` whose timestamp is within
+    # [since, until), oldest first. Tags and attendees are found through the
+    # (kind, normalised) index, dates through the timestamp index.
+    sql, parameters = get_note_filter(tags, attendees, since, until)
+    rows = connection.execute(
+        'SELECT notes.path, notes.timestamp, items.value FROM items'
+        ' JOIN notes ON notes.note_id = items.note_id'
+        f' WHERE items.kind = ? AND items.note_id IN ({sql})'
+        ' ORDER BY notes.timestamp, items.position',
+        [kind] + parameters,
+        )
+    return rows.fetchall()
+
+
+def count_items(connection, kind, tags=(), attendees=(), since=None, until=None):
+    # Returns (value, number of notes) for every distinct `kind` item of the
+    # matching notes, most common first, e.g. the tags used with an attendee.
+    sql, parameters = get_note_filter(tags, attendees, since, until)
+    rows = connection.execute(
+        'SELECT MIN(items.value), COUNT(DISTINCT items.note_id) AS notes FROM items'
+        f' WHERE items.kind = ? AND items.note_id IN ({sql})'
+        ' GROUP BY items.normalised ORDER BY notes DESC, items.normalised',
+        [kind] + parameters,
+        )
+    return rows.fetchall()
+
+
+def get_note_filter(tags=(), attendees=(), since=None, until=None):
+    sql = 'SELECT note_id FROM notes WHERE timestamp >= ? AND timestamp < ?'
+    parameters = [since or '', until or '~']
+    for kind, values in (('tag', tags), ('attendee', attendees)):
+        for value in values:
+            sql = f'SELECT note_id FROM items WHERE kind = ? AND normalised = ? AND note_id IN ({sql})'
+            parameters = [kind, normalise(value)] + parameters
+    return sql, parameters
+
+
+def get_note_facets(file):
+    sections = read_sections(file, wanted=tuple(FACET_SECTIONS))
+    return {
+        kind: [value.strip() for value in get_list_items(sections.get(heading, '')) if value.strip()]
+        for heading, kind in FACET_SECTIONS.items()
+        }
+
+
+def normalise(value):
+    # Tags are written both as '#alpha' and 'alpha'
+    return value.strip().lstrip('#').strip().casefold()
@@ -0,0 +1,153 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# Shared timings and counters for every command, turned on with --profile or DEV_TOOLS_PROFILE.
+
+import click
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+
+from datetime import datetime
+from pathlib import Path
+
+PROFILE_VARIABLE = 'DEV_TOOLS_PROFILE'
+CPROFILE_VARIABLE = 'DEV_TOOLS_CPROFILE'
+
+# The recording of the running command, None when profiling is off so that
+# `phase` and `count` cost next to nothing.
+recording = None
+recording_lock = threading.Lock()
+
+
+def profiled(command_name):
+    # Adds --profile and --cprofile options to a click command. The report is
+    # written once the command, and any subcommand of a group, has finished.
+    def decorator(function):
+        @click.option('--profile', 'profile_report', is_flag=True, help=f'Report timings and counters, also turned on by {PROFILE_VARIABLE}.')
+        @click.option('--cprofile', 'cprofile_path', default=None, type=click.Path(dir_okay=False), help=f'Also write a cProfile dump here, or set {CPROFILE_VARIABLE}.')
+        @functools.wraps(function)
+        def wrapper(*args, profile_report=False, cprofile_path=None, **kwargs):
+            report_path = get_report_path(command_name, profile_report)
+            cprofile_path = cprofile_path or os.environ.get(CPROFILE_VARIABLE) or None
+            if (report_path or cprofile_path) and recording is None:
+                start(command_name, report_path, cprofile_path)
+                click.get_current_context().call_on_close(finish)
+            return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_report_path(command_name, enabled=False):
+    # DEV_TOOLS_PROFILE=1 writes to the default report, any other value is a path
+    value = os.environ.get(PROFILE_VARIABLE, '')
+    if value and value.lower() not in ('1', 'true', 'yes'):
+        return Path(value).expanduser()
+    if enabled or value:
+        return Path.home() / '.dev-tools' / 'dot-files' / '.dtprofile' / f'{command_name}.json'
+    return None
+
+
+def start(command_name, report_path=None, cprofile_path=None):
+    global recording
+    recording = {
+        'command': command_name,
+        'arguments': sys.argv[1:],
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'report_path': report_path,
+        'cprofile_path': cprofile_path,
+        'origin': time.perf_counter(),
+        'phases': dict(),
+        'counters': dict(),
+        'errors': list(),
+        'profiler': None,
+        }
+    if cprofile_path:
+        import cProfile
+        recording['profiler'] = cProfile.Profile()
+        recording['profiler'].enable()
+
+
+def finish():
+    # Writes the JSON report and prints a summary of it to stderr
+    global recording
+    if recording is None:
+        return
+    current, recording = recording, None
+    if current['profiler']:
+        current['profiler'].disable()
+        os.makedirs(Path(current['cprofile_path']).parent, exist_ok=True)
+        current['profiler'].dump_stats(current['cprofile_path'])
+    report = {
+        'command': current['command'],
+        'arguments': current['arguments'],
+        'started_at': current['started_at'],
+        'seconds': time.perf_counter() - current['origin'],
+        'phases': current['phases'],
+        'counters': current['counters'],
+        'errors': current['errors'],
+        'cprofile': str(current['cprofile_path']) if current['cprofile_path'] else None,
+        }
+    if current['report_path']:
+        os.makedirs(current['report_path'].parent, exist_ok=True)
+        temp_path = current['report_path'].with_name(f"{current['report_path'].name}.{os.getpid()}.tmp")
+        with open(temp_path, 'w') as file:
+            json.dump(report, file, indent=4)
+        os.replace(temp_path, current['report_path'])
+    display_report(report, current['report_path'])
+    return report
+
+
+@contextlib.contextmanager
+def timed_phase(name):
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        if recording is not None:
+            with recording_lock:
+                phase_timing = recording['phases'].setdefault(name, {'seconds': 0.0, 'calls': 0})
+                phase_timing['seconds'] += time.perf_counter() - start_time
+                phase_timing['calls'] += 1
+
+
+def phase(name):
+    # Times a block, adding to earlier blocks of the same name, e.g.
+    #   with phase('parse'):
+    return timed_phase(name) if recording is not None else contextlib.nullcontext()
+
+
+def count(name, amount=1):
+    if recording is not None:
+        with recording_lock:
+            recording['counters'][name] = recording['counters'].get(name, 0) + amount
+
+
+def record_error(error):
+    # Commands show errors as a single line, the report keeps the traceback
+    if recording is not None:
+        recording['errors'].append(''.join(traceback.format_exception(error)))
+
+
+def display_report(report, report_path=None):
+    echo = functools.partial(click.echo, err=True)
+    echo(click.style(f"~~~ Profile of {report['command']} ~~~", fg='green'))
+    phases = sorted(report['phases'].items(), key=lambda item: -item[1]['seconds'])
+    for name, phase_timing in phases:
+        share = phase_timing['seconds'] / report['seconds'] if report['seconds'] else 0
+        echo(click.style(
+            f"  - {name:<24}{phase_timing['seconds'] * 1000:>10.1f} ms {share:>6.1%}  x{phase_timing['calls']}",
+            fg='bright_cyan',
+            ))
+    for name, value in sorted(report['counters'].items()):
+        echo(click.style(f'  - {name:<24}{value:>10}', fg='cyan'))
+    echo(click.style(f"  - {'total':<24}{report['seconds'] * 1000:>10.1f} ms", fg='bright_cyan'))
+    for error in report['errors']:
+        echo(click.style(error.rstrip(), fg='red'))
+    if report_path:
+        echo(click.style(f'  Report written to {report_path}', fg='cyan'))
+    if report['cprofile']:
+        echo(click.style(f"  cProfile dump written to {report['cprofile']}", fg='cyan'))
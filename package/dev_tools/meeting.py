@@ -2,96 +2,96 @@
 # A command to create templated meeting notes.
 
 import click
-import shutil
+import csv
+import json
 import os
 import re
 
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
 
+from dev_tools import daemon
+from dev_tools.actions import TIMESTAMP_REGEX, get_note_actions
+from dev_tools.config import load_config, get_config_path, get_notes_dirs
+from dev_tools.instrument import profiled, phase, record_error
+from dev_tools.sections import read_sections, parse_sections
+from dev_tools.store import open_store, get_store_path, sync_actions, get_open_actions, close_actions, split_action
+from dev_tools.templates import render, compile_template, render_template, write_rendered
+from dev_tools.walk import walk_notes_by_name
+
+KIT_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]_*Keeping in Touch.md"
+KIT_SECTIONS = ("### Check-in", "## Goals", "### Actions")
+DAILY_NOTE_SUFFIX = " - Daily Notes.md"
+
 
 @click.command()
 @click.option("--kit", is_flag=True, help="Keeping in Touch.")
 @click.option("--daily", is_flag=True, help="Daily tracker.")
-def cli(kit, daily):
-    if kit:
+@click.option(
+    "--batch",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="CSV or JSON schedule of notes to create, with title, datetime, kind and member columns.",
+)
+@click.option(
+    "--no-rollover",
+    is_flag=True,
+    help="Start a daily note without the open actions of the previous one.",
+)
+@click.option(
+    "--older-than",
+    type=click.IntRange(min=0),
+    default=None,
+    help="Also carry every open action older than this many days into a daily note.",
+)
+@profiled("meeting")
+def cli(kit, daily, batch, no_rollover, older_than):
+    if batch:
+        new_batch(batch)
+    elif kit:
         new_kit()
     elif daily:
-        new_daily()
+        new_daily(rollover=not no_rollover, older_than=older_than)
     else:
         new_meeting()
 
 
 def new_meeting():
-    notes_dir = Path.home() / "Notes/"
     devtools_dir = Path.home() / ".dev-tools/"
-    ## TODO: switch these to environment variables or config
+    # New notes go to the first notes root, shared roots are only read
+    notes_dir = get_notes_dirs(load_config())[0]
 
     is_successful = False
     error_message = ""
     date = datetime.now()
 
-    temp_dir = devtools_dir / ".temp/"
-
-    if temp_dir.is_dir():
-        shutil.rmtree(temp_dir)
-
-    os.mkdir(temp_dir.absolute())
-
     try:
         display("~~~ Loading Meeting Notes ~~~", "green")
 
-        today_dir = (
-            notes_dir
-            / date.strftime("%Y")
-            / date.strftime("%m-%B")
-            / date.strftime("%d-%A")
-        )
-        if not today_dir.is_dir():
-            os.makedirs(today_dir)
+        today_dir = get_day_dir(notes_dir, date)
 
-        files_to_copy = (devtools_dir / "templates" / "meeting_note").glob("**/*")
-        for i in files_to_copy:
-            shutil.copy(i, temp_dir)
+        placeholders = get_meeting_placeholders(date)
 
-        placeholders = (
-            ("{{ TIME STAMP }}", date.strftime("%Y-%m-%d_%H-%M-%S")),
-            ("{{ LONG DATE }}", date.strftime("%A, %d %b %Y")),
+        display("  - Rendering meeting notes template...")
+        written = render(
+            devtools_dir / "templates" / "meeting_note",
+            placeholders,
+            today_dir,
+            cache_dir=devtools_dir / ".template_cache",
         )
-
-        display("  - Replacing placeholder filenames...")
-        for path in temp_dir.glob("**/*"):
-            name = path.name
-            for placeholder in placeholders:
-                name = name.replace(placeholder[0], placeholder[1])
-            os.rename(path, path.parent / name)
-
-        display("  - Populating previous info...")
-        for path in temp_dir.glob("**/*"):
-            with open(path, "r+") as _file:
-                contents = "".join(_file.readlines())
-                for placeholder in placeholders:
-                    contents = contents.replace(placeholder[0], placeholder[1])
-                _file.seek(0)
-                _file.write(contents)
-                _file.truncate()
-
-        files_to_copy = temp_dir.glob("**/*")
-        for i in files_to_copy:
-            shutil.copy(i, today_dir)
+        record_latest_note(devtools_dir, "meeting", written[0])
 
         is_successful = True
     except Exception as e:
         display("There was a failure.", "cyan")
+        record_error(e)
         exception_message = getattr(e, "message", repr(e))
 
-    shutil.rmtree(temp_dir)
     if is_successful:
         os.system(
             f'code {today_dir.absolute()} {today_dir / date.strftime("%Y-%m-%d_%H-%M-%S.md")}'
         )
     else:
-        display("  - Restoring...")
         error_message += exception_message
         if not error_message:
             error_message = "An unknown error occurred"
@@ -99,31 +99,21 @@ def new_meeting():
 
 
 def new_kit():
-    notes_dir = Path.home() / "Notes"
-    kit_dir = notes_dir / "Meeting Notes" / "Keeping in Touch"
     devtools_dir = Path.home() / ".dev-tools"
-    ## TODO: switch these to environment variables or config
+    config = load_config()
+    notes_dir = get_notes_dirs(config)[0]
+    kit_dir = get_config_path(config, "kit_notes_dir", notes_dir / "Meeting Notes" / "Keeping in Touch")
 
     is_successful = False
     error_message = "There was a failure:\n"
     date = datetime.now()
 
-    temp_dir = devtools_dir / ".temp/"
-
-    if temp_dir.is_dir():
-        shutil.rmtree(temp_dir)
     os.makedirs(kit_dir, exist_ok=True)
 
-    os.makedirs(temp_dir.absolute(), exist_ok=True)
     try:
         is_successful = False
         display("~~~ Loading Meeting Notes ~~~", "green")
 
-        # Copy kit notes into temp
-        files_to_copy = (devtools_dir / "templates" / "kit_note").glob("**/*")
-        for i in files_to_copy:
-            shutil.copy(i, temp_dir)
-
         # Show team member selection interface
         display("Team Members:", "bright_yellow")
 
@@ -139,7 +129,7 @@ def new_kit():
 
         # Read and process result
         if team_member_id in ("n", "N"):
-            return new_team_member(kit_dir=kit_dir, date=date, temp_dir=temp_dir)
+            return new_team_member(kit_dir=kit_dir, date=date, devtools_dir=devtools_dir)
         elif int(team_member_id) in range(len(team_members)):
             team_member = team_members[int(team_member_id)]
         else:
@@ -147,69 +137,24 @@ def new_kit():
 
         display("  - Building notes template...")
 
-        display("  - Loading last meeting...")
-        most_recent_kit = list(
-            (kit_dir / team_member).glob("*")
-        )  ## TODO: Change glob argument to only target KIT files
-        most_recent_kit.sort()
-        most_recent_kit = most_recent_kit[-1]
-
         # Find information from the most recent kit
         # And extract it into the new one
-        display("  - Extracting information from last meeting...")
-        with open(most_recent_kit, "r") as file:
-            data = "".join(file.readlines())
-        regex = "^(?:(?:.*\n)*)### Check-in\n((?:.*\n)*)\n## Goals\n((?:.*\n)*)\n## Actions\n(?:(?:.*\n)*)\n### Actions\n((?:.*\n*)*)\n### Tags"
-        match = re.match(regex, data)
-
-        # Define values to replace
-        placeholders = (
-            ("{{ TIME STAMP }}", date.strftime("%Y-%m-%d_%H-%M-%S")),
-            ("{{ LONG DATE }}", date.strftime("%A, %d %b %Y")),
-            ("{{ SHORT DATE }}", date.strftime("%Y-%m-%d")),
-            ("{{ TEAM MEMBER }}", team_member.name),
-            ("{{ LAST WE SPOKE }}", match.group(1).strip()),
-            ("{{ GOALS }}", match.group(2).strip()),
-            ("{{ PROPOSED ACTIONS }}", match.group(3).strip()),
-        )
+        display("  - Loading last meeting...")
+        most_recent_kit, sections = get_latest_kit(devtools_dir, team_member)
+        placeholders = get_kit_placeholders(date, team_member, sections)
 
-        display("  - Replacing placeholder filenames...")
-        for path in temp_dir.glob("**/*"):
-            name = path.name
-            for placeholder in placeholders:
-                name = name.replace(placeholder[0], placeholder[1])
-            os.rename(path, path.parent / name)
-
-        display("  - Populating previous info...")
-        for path in temp_dir.glob("**/*"):
-            with open(path, "r+") as _file:
-                contents = "".join(_file.readlines())
-                for placeholder in placeholders:
-                    contents = contents.replace(placeholder[0], placeholder[1])
-                _file.seek(0)
-                _file.write(contents)
-                _file.truncate()
-
-        files_to_copy = temp_dir.glob("**/*")
-        for i in files_to_copy:
-            shutil.copy(i, team_member)
-
-        most_recent_kit = list(
-            (kit_dir / team_member).glob("*")
-        )  ## TODO: Change glob argument to only target KIT files
-        most_recent_kit.sort()
-        most_recent_kit = most_recent_kit[-1]
+        display("  - Rendering notes template...")
+        new_kit_note = write_kit(devtools_dir, team_member, placeholders)
 
         is_successful = True
     except Exception as e:
         display("There was a failure.", "cyan")
+        record_error(e)
         exception_message = getattr(e, "message", repr(e))
 
-    display("  - Restoring...")
-    shutil.rmtree(temp_dir)
     if is_successful:
         display("  - Opening notes")
-        os.system(f'code "{team_member.absolute()}" "{most_recent_kit.absolute()}"')
+        os.system(f'code "{team_member.absolute()}" "{new_kit_note.absolute()}"')
         display("Done!", "bright_green")
     else:
         error_message += exception_message
@@ -218,7 +163,9 @@ def new_kit():
         display(error_message, "cyan")
 
 
-def new_team_member(kit_dir, date, temp_dir):
+def new_team_member(kit_dir, date, devtools_dir):
+    is_successful = False
+    error_message = "There was a failure:\n"
     try:
         team_member = click.prompt(
             click.style(f"New team member name: ", fg="bright_yellow"),
@@ -228,53 +175,20 @@ def new_team_member(kit_dir, date, temp_dir):
         os.mkdir(team_member.absolute())
 
         # Define values to replace
-        placeholders = (
-            ("{{ TIME STAMP }}", date.strftime("%Y-%m-%d_%H-%M-%S")),
-            ("{{ LONG DATE }}", date.strftime("%A, %d %b %Y")),
-            ("{{ SHORT DATE }}", date.strftime("%Y-%m-%d")),
-            ("{{ TEAM MEMBER }}", team_member.name),
-            ("{{ LAST WE SPOKE }}", "- "),
-            ("{{ GOALS }}", "- "),
-            ("{{ PROPOSED ACTIONS }}", "- "),
-        )
+        placeholders = get_kit_placeholders(date, team_member, dict())
 
-        display("  - Replacing placeholder filenames...")
-        for path in temp_dir.glob("**/*"):
-            name = path.name
-            for placeholder in placeholders:
-                name = name.replace(placeholder[0], placeholder[1])
-            os.rename(path, path.parent / name)
-
-        display("  - Populating previous info...")
-        for path in temp_dir.glob("**/*"):
-            with open(path, "r+") as _file:
-                contents = "".join(_file.readlines())
-                for placeholder in placeholders:
-                    contents = contents.replace(placeholder[0], placeholder[1])
-                _file.seek(0)
-                _file.write(contents)
-                _file.truncate()
-
-        files_to_copy = temp_dir.glob("**/*")
-        for i in files_to_copy:
-            shutil.copy(i, team_member)
-
-        most_recent_kit = list(
-            (kit_dir / team_member).glob("*")
-        )  ## TODO: Change glob argument to only target KIT files
-        most_recent_kit.sort()
-        most_recent_kit = most_recent_kit[-1]
+        display("  - Rendering notes template...")
+        new_kit_note = write_kit(devtools_dir, team_member, placeholders)
 
         is_successful = True
     except Exception as e:
         display("There was a failure.", "cyan")
+        record_error(e)
         exception_message = getattr(e, "message", repr(e))
 
-    display("  - Restoring...")
-    shutil.rmtree(temp_dir)
     if is_successful:
         display("  - Opening notes")
-        os.system(f'code "{team_member.absolute()}" "{most_recent_kit.absolute()}"')
+        os.system(f'code "{team_member.absolute()}" "{new_kit_note.absolute()}"')
         display("Done!", "bright_green")
     else:
         error_message += exception_message
@@ -283,84 +197,380 @@ def new_team_member(kit_dir, date, temp_dir):
         display(error_message, "cyan")
 
 
-def new_daily():
-    notes_dir = Path.home() / "Notes/"
+def new_daily(rollover=True, older_than=None):
     devtools_dir = Path.home() / ".dev-tools/"
-    ## TODO: switch these to environment variables or config
+    notes_dir = get_notes_dirs(load_config())[0]
 
     is_successful = False
     error_message = ""
     date = datetime.now()
 
-    temp_dir = devtools_dir / ".temp/"
-
-    if temp_dir.is_dir():
-        shutil.rmtree(temp_dir)
-
-    os.mkdir(temp_dir.absolute())
-
     try:
         display("~~~ Loading Meeting Notes ~~~", "green")
 
-        today_dir = (
-            notes_dir
-            / date.strftime("%Y")
-            / date.strftime("%m-%B")
-            / date.strftime("%d-%A")
-        )
-        if not today_dir.is_dir():
-            os.makedirs(today_dir)
+        today_dir = get_day_dir(notes_dir, date)
 
-        # Copy daily notes into temp
-        files_to_copy = (devtools_dir / "templates" / "daily_note").glob("**/*")
-        for i in files_to_copy:
-            shutil.copy(i, temp_dir)
+        carried_actions = list()
+        if rollover or older_than is not None:
+            display("  - Loading open actions...")
+            store = open_store(get_store_path(devtools_dir))
+            with phase("rollover"):
+                carried_actions = get_rollover_actions(
+                    store, devtools_dir, notes_dir, date, previous=rollover, older_than=older_than
+                )
 
         # Define values to replace
-        placeholders = (
-            ("{{ TIME STAMP }}", date.strftime("%Y-%m-%d_%H-%M-%S")),
-            ("{{ LONG DATE }}", date.strftime("%A, %d %b %Y")),
+        placeholders = get_daily_placeholders(date, get_action_lines(carried_actions))
+
+        display("  - Rendering daily notes template...")
+        written = render(
+            devtools_dir / "templates" / "daily_note",
+            placeholders,
+            today_dir,
+            cache_dir=devtools_dir / ".template_cache",
         )
-
-        display("  - Replacing placeholder filenames...")
-        for path in temp_dir.glob("**/*"):
-            name = path.name
-            for placeholder in placeholders:
-                name = name.replace(placeholder[0], placeholder[1])
-            os.rename(path, path.parent / name)
-
-        display("  - Populating previous info...")
-        for path in temp_dir.glob("**/*"):
-            with open(path, "r+") as _file:
-                contents = "".join(_file.readlines())
-                for placeholder in placeholders:
-                    contents = contents.replace(placeholder[0], placeholder[1])
-                _file.seek(0)
-                _file.write(contents)
-                _file.truncate()
-
-        files_to_copy = temp_dir.glob("**/*")
-        for i in files_to_copy:
-            shutil.copy(i, today_dir)
+        record_latest_note(devtools_dir, "daily", written[0])
+        if carried_actions:
+            # The actions now live in the new note, they are not done
+            close_actions(store, carried_actions, kind="carried")
+            display(f"  - Carried over {len(carried_actions)} open actions")
 
         is_successful = True
     except Exception as e:
         display("There was a failure.", "cyan")
+        record_error(e)
         exception_message = getattr(e, "message", repr(e))
 
-    shutil.rmtree(temp_dir)
     if is_successful:
         os.system(
             f'code "{today_dir.absolute()}" "{today_dir / date.strftime("%Y-%m-%d_%H-%M-%S - Daily Notes.md")}"'
         )
         display("Done!", "bright_green")
     else:
-        display("  - Restoring...")
         error_message += exception_message
         if not error_message:
             error_message = "An unknown error occurred"
         display(error_message, "cyan")
 
 
+def new_batch(schedule_path):
+    devtools_dir = Path.home() / ".dev-tools/"
+    config = load_config()
+    notes_dir = get_notes_dirs(config)[0]
+    kit_dir = get_config_path(config, "kit_notes_dir", notes_dir / "Meeting Notes" / "Keeping in Touch")
+
+    is_successful = False
+    error_message = ""
+
+    try:
+        display("~~~ Loading Meeting Notes ~~~", "green")
+        display("  - Reading schedule...")
+        schedule = read_schedule(schedule_path)
+
+        display("  - Rendering notes templates...")
+        cache_dir = devtools_dir / ".template_cache"
+        latest_kits = dict()
+        notes = list()
+        with phase("render"):
+            for entry in schedule:
+                date = entry["datetime"]
+                if entry["kind"] == "meeting":
+                    template_name = "meeting_note"
+                    destination = get_day_dir(notes_dir, date)
+                    placeholders = get_meeting_placeholders(date, entry["title"] or "_MEETING_")
+                elif entry["kind"] == "daily":
+                    template_name = "daily_note"
+                    destination = get_day_dir(notes_dir, date)
+                    placeholders = get_daily_placeholders(date)
+                else:
+                    template_name = "kit_note"
+                    destination = kit_dir / entry["member"].title().strip()
+                    if destination not in latest_kits:
+                        latest_kits[destination] = get_latest_kit(devtools_dir, destination)[1]
+                    placeholders = get_kit_placeholders(date, destination, latest_kits[destination])
+                template = compile_template(devtools_dir / "templates" / template_name, cache_dir)
+                notes.append((render_template(template, placeholders), destination, entry["kind"]))
+
+        notes = get_unclaimed_notes(notes)
+
+        display(f"  - Writing {len(notes)} notes...")
+        for destination in set(destination for _, destination, _ in notes):
+            os.makedirs(destination, exist_ok=True)
+        with phase("write"), ThreadPoolExecutor() as executor:
+            written = list(executor.map(lambda note: write_rendered(*note[:2]), notes))
+        for (rendered, destination, kind), paths in zip(notes, written):
+            if kind == "kit":
+                record_kit(devtools_dir, destination, paths[0], rendered["files"][paths[0].name])
+            else:
+                record_latest_note(devtools_dir, kind, paths[0])
+            for path in paths:
+                display(f"    {get_display_path(path, notes_dir)}")
+
+        is_successful = True
+    except Exception as e:
+        display("There was a failure.", "cyan")
+        record_error(e)
+        exception_message = getattr(e, "message", repr(e))
+
+    if is_successful:
+        if notes:
+            os.system(f'code "{notes_dir.absolute()}"')
+        display("Done!", "bright_green")
+    else:
+        error_message += exception_message
+        if not error_message:
+            error_message = "An unknown error occurred"
+        display(error_message, "cyan")
+
+
+def get_display_path(path, notes_dir):
+    # KIT notes may be kept outside the notes folder, those are shown in full
+    try:
+        return path.relative_to(notes_dir)
+    except ValueError:
+        return path
+
+
+def read_schedule(schedule_path):
+    # A schedule is a CSV file with a header row or a JSON list of objects, e.g.
+    #   title,datetime,kind,member
+    #   Sprint Planning,2024-01-08 09:30,meeting,
+    #   ,2024-01-08 09:00,daily,
+    #   ,2024-01-08 14:00,kit,Alice
+    if schedule_path.suffix.lower() == ".json":
+        with open(schedule_path, "r") as file:
+            rows = json.load(file)
+    else:
+        with open(schedule_path, "r", newline="") as file:
+            rows = list(csv.DictReader(file))
+
+    schedule = list()
+    for row_number, row in enumerate(rows, start=1):
+        row = {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+        kind = row.get("kind") or "meeting"
+        if kind not in ("meeting", "daily", "kit"):
+            raise Exception(f"Schedule entry {row_number} has an unknown kind '{kind}'")
+        if kind == "kit" and not row.get("member"):
+            raise Exception(f"Schedule entry {row_number} is a KIT without a member")
+        schedule.append({
+            "title": row.get("title", ""),
+            "datetime": datetime.fromisoformat(row["datetime"]),
+            "kind": kind,
+            "member": row.get("member", ""),
+        })
+    return schedule
+
+
+def get_unclaimed_notes(notes):
+    # Never overwrites an existing note, and refuses schedules that would
+    # create the same note twice.
+    claimed = set()
+    unclaimed = list()
+    for rendered, destination, kind in notes:
+        paths = set(destination / path for path in rendered["files"])
+        if paths & claimed:
+            raise Exception(f"The schedule creates {sorted(paths & claimed)[0]} more than once")
+        claimed.update(paths)
+        existing = [path for path in paths if path.exists()]
+        if existing:
+            display(f"    {existing[0].name} already exists, skipping", "yellow")
+            continue
+        unclaimed.append((rendered, destination, kind))
+    return unclaimed
+
+
+def get_day_dir(notes_dir, date):
+    return (
+        notes_dir
+        / date.strftime("%Y")
+        / date.strftime("%m-%B")
+        / date.strftime("%d-%A")
+    )
+
+
+def get_meeting_placeholders(date, title="_MEETING_"):
+    return {
+        "TIME STAMP": date.strftime("%Y-%m-%d_%H-%M-%S"),
+        "LONG DATE": date.strftime("%A, %d %b %Y"),
+        "TITLE": title,
+    }
+
+
+def get_daily_placeholders(date, actions="- "):
+    return {
+        "TIME STAMP": date.strftime("%Y-%m-%d_%H-%M-%S"),
+        "LONG DATE": date.strftime("%A, %d %b %Y"),
+        "ACTIONS": actions,
+    }
+
+
+def get_rollover_actions(store, devtools_dir, notes_dir, date, previous=True, older_than=None):
+    # Returns the open actions to carry into a daily note written at `date`:
+    # every open action from more than `older_than` days ago, then those of the
+    # previous daily note. The previous note is read again in case it was
+    # edited after actions last ran, other notes are as actions last saw them.
+    carried_actions = dict()
+    if older_than is not None:
+        cutoff = (date - timedelta(days=older_than)).strftime("%Y-%m-%d_%H-%M-%S")
+        carried_actions.update(get_open_actions(store, until=cutoff))
+    previous_note = find_previous_daily(devtools_dir, notes_dir, date) if previous else None
+    if previous_note:
+        timestamp = re.match(TIMESTAMP_REGEX, previous_note.name).group(0)
+        note = get_note_actions(previous_note)
+        note_actions = dict.fromkeys(note["actions"], str(previous_note))
+        sync_actions(store, note_actions, since=timestamp, until=f"{timestamp}~", notes={str(previous_note): note})
+        open_actions = get_open_actions(store, since=timestamp, until=f"{timestamp}~")
+        carried_actions.update((action, None) for action in note_actions if action in open_actions)
+    return list(carried_actions)
+
+
+def get_action_lines(actions):
+    return "\n".join(f"- {split_action(action)[2]}" for action in actions) or "- "
+
+
+def find_previous_daily(devtools_dir, notes_dir, date):
+    # The latest daily note from before `date`, read from the latest notes
+    # index. Only when the index has none, e.g. the first time, are the newest
+    # day folders walked back until one turns up.
+    timestamp = date.strftime("%Y-%m-%d_%H-%M-%S")
+    latest_note = load_latest_notes(devtools_dir).get("daily")
+    if latest_note and Path(latest_note).name < timestamp and Path(latest_note).is_file():
+        return Path(latest_note)
+    for note in walk_notes_by_name(notes_dir, until=timestamp, archives=False, reverse=True):
+        if note.name.endswith(DAILY_NOTE_SUFFIX):
+            return note
+    return None
+
+
+def get_latest_index_path(devtools_dir):
+    return devtools_dir / "dot-files" / ".dtlatest"
+
+
+def load_latest_notes(devtools_dir):
+    # {kind: path of the latest note of that kind}, e.g. {"daily": "..."}
+    index_path = get_latest_index_path(devtools_dir)
+    if not index_path.is_file():
+        return dict()
+    try:
+        with open(index_path, "r") as file:
+            return json.load(file)
+    except ValueError:
+        return dict()
+
+
+def record_latest_note(devtools_dir, kind, note):
+    # Makes a newly written note the latest of its kind, unless a later one,
+    # like a note scheduled ahead by --batch, is already recorded.
+    latest_notes = load_latest_notes(devtools_dir)
+    latest_note = latest_notes.get(kind)
+    if latest_note and Path(latest_note).name > note.name and Path(latest_note).is_file():
+        return
+    latest_notes[kind] = str(note)
+    index_path = get_latest_index_path(devtools_dir)
+    os.makedirs(index_path.parent, exist_ok=True)
+    temp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    with open(temp_path, "w") as file:
+        json.dump(latest_notes, file)
+    os.replace(temp_path, index_path)
+
+
+def get_latest_kit(devtools_dir, team_member):
+    # Returns the path and carry forward sections of a team member's latest KIT
+    # from their index, so no folder listing or parsing is needed. The note is
+    # only parsed again when it has been edited since it was indexed.
+    index_path = get_kit_index_path(devtools_dir, team_member)
+    kit_index = load_kit_index(index_path)
+    most_recent_kit = Path(kit_index["latest"]) if kit_index else None
+    if not most_recent_kit or not most_recent_kit.is_file():
+        # Team members without an index yet
+        most_recent_kit = find_latest_kit(team_member)
+        kit_index = None
+    if not most_recent_kit:
+        return None, dict()
+
+    stat = os.stat(most_recent_kit)
+    signature = [stat.st_mtime_ns, stat.st_size]
+    if kit_index and kit_index["signature"] == signature:
+        return most_recent_kit, kit_index["sections"]
+    sections = read_kit_sections(most_recent_kit)
+    save_kit_index(index_path, most_recent_kit, signature, sections)
+    return most_recent_kit, sections
+
+
+def record_kit(devtools_dir, team_member, kit_note, contents):
+    # Makes a newly written KIT the latest in its team member's index.
+    index_path = get_kit_index_path(devtools_dir, team_member)
+    kit_index = load_kit_index(index_path)
+    if kit_index and Path(kit_index["latest"]).name > kit_note.name:
+        return
+    stat = os.stat(kit_note)
+    sections = parse_sections(contents.splitlines(), wanted=KIT_SECTIONS)
+    save_kit_index(index_path, kit_note, [stat.st_mtime_ns, stat.st_size], sections)
+
+
+def find_latest_kit(team_member):
+    most_recent_kit = list(team_member.glob(KIT_GLOB))
+    most_recent_kit.sort()
+    return most_recent_kit[-1] if most_recent_kit else None
+
+
+def read_kit_sections(kit_note):
+    daemon_response = daemon.query("sections", path=str(kit_note))
+    if daemon_response and daemon_response["sections"] is not None:
+        return {
+            heading: body
+            for heading, body in daemon_response["sections"].items()
+            if heading in KIT_SECTIONS
+        }
+    return read_sections(kit_note, wanted=KIT_SECTIONS)
+
+
+def get_kit_index_path(devtools_dir, team_member):
+    return devtools_dir / "dot-files" / ".dtkit" / f"{team_member.name}.json"
+
+
+def load_kit_index(index_path):
+    if not index_path.is_file():
+        return None
+    try:
+        with open(index_path, "r") as file:
+            return json.load(file)
+    except ValueError:
+        return None
+
+
+def save_kit_index(index_path, kit_note, signature, sections):
+    os.makedirs(index_path.parent, exist_ok=True)
+    temp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    with open(temp_path, "w") as file:
+        json.dump(
+            {"latest": str(kit_note), "signature": signature, "sections": sections},
+            file,
+        )
+    os.replace(temp_path, index_path)
+
+
+def write_kit(devtools_dir, team_member, placeholders):
+    template = compile_template(
+        devtools_dir / "templates" / "kit_note", devtools_dir / ".template_cache"
+    )
+    rendered = render_template(template, placeholders)
+    new_kit_note = write_rendered(rendered, team_member)[0]
+    record_kit(devtools_dir, team_member, new_kit_note, rendered["files"][new_kit_note.name])
+    return new_kit_note
+
+
+def get_kit_placeholders(date, team_member, sections):
+    return {
+        "TIME STAMP": date.strftime("%Y-%m-%d_%H-%M-%S"),
+        "LONG DATE": date.strftime("%A, %d %b %Y"),
+        "SHORT DATE": date.strftime("%Y-%m-%d"),
+        "TEAM MEMBER": team_member.name,
+        "LAST WE SPOKE": sections.get("### Check-in", "").strip() or "- ",
+        "GOALS": sections.get("## Goals", "").strip() or "- ",
+        "PROPOSED ACTIONS": sections.get("### Actions", "").strip() or "- ",
+    }
+
+
 def display(message, color="bright_cyan"):
     click.echo(click.style(message, fg=color))
@@ -2,131 +2,228 @@
 # A command to create a new development environment under a temporary directory.
 
 import click
+import json
 import shutil
 import subprocess
 import os
 import re
-import virtualenv
-import git
+import sys
+import time
 
 from random import randrange
 from datetime import datetime
 from pathlib import Path
+from uuid import uuid4
+
+from dev_tools.instrument import profiled, phase, record_error
+from dev_tools.pipeline import run_steps
+from dev_tools.config import load_config, get_config_value, get_config_list, get_config_path
+from dev_tools.seed import get_seed, get_seeds_dir, get_wheelhouse_dir, get_seed_name, clone_seed, relocate_venv, rewrite_file
+from dev_tools.templates import render, compile_template, render_template, write_rendered
+
+POOL_DIR_NAME = '.dev-tools-pool'
+POOL_MARKER_NAME = '.dev-tools-pool.json'
 
 @click.command()
-def cli():
-    new_environment()
+@click.option('--python', default=None, help='Interpreter to build the environment with, defaults to the current one.')
+@click.option('--offline', is_flag=True, help='Never use the network, seeds are built from the local wheelhouse.')
+@click.option('--refresh-seed', is_flag=True, help='Refresh the wheelhouse and rebuild the cached seed environment first.')
+@click.option('--fill-pool', is_flag=True, help='Build ready-made environments until the pool in .dtconfig is full.')
+@click.option('--timings', is_flag=True, help='Show how long each step took at the end.')
+@profiled('newenv')
+def cli(python, offline, refresh_seed, fill_pool, timings):
+    if fill_pool:
+        fill_environment_pool(offline=offline, timings=timings)
+    else:
+        new_environment(python=python, offline=offline, refresh_seed=refresh_seed, timings=timings)
 
-def new_environment(env_name=None):
+def new_environment(env_name=None, python=None, offline=False, refresh_seed=False, timings=False):
     dev_tools_dir = Path.home() / '.dev-tools'
-    temp_dir = dev_tools_dir/'.temp/'
-    env_dir = Path.home() / 'development/'
+    config = load_config(dev_tools_dir)
+    env_dir = get_config_path(config, 'development_dir', Path.home() / 'development/')
 
     is_successful = False
     error_message = ''
     date = datetime.now()
 
-    first_name = 'Frankie'
-    last_name = 'Homewood'
-    contact = 'fhomewood98@gmail.com'
+    author = get_author(config)
 
     env_num = 0 # randrange(10000,99999)
 
     if not env_name:
         env_name = f'project_{env_num}'
     env_path = env_dir / env_name
+    started = time.perf_counter()
+    step_timings = dict()
 
     try:
         display(f'~~~ Building Environment #{env_num} ~~~', 'green')
-        display('  - Building path...')
+        pool_dir = get_pool_dir(env_dir, python)
+        with phase('pool claim'):
+            claimed = not refresh_seed and claim_environment(dev_tools_dir, pool_dir, env_path, env_name, date, author)
+        if claimed:
+            step_timings['pool claim'] = (0, time.perf_counter() - started)
+            display('  - Claimed a ready-made environment from the pool...')
+        else:
+            step_timings = build_environment(
+                dev_tools_dir,
+                env_path,
+                env_name,
+                env_num,
+                date,
+                author,
+                python=python,
+                offline=offline,
+                refresh_seed=refresh_seed,
+            )
 
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        is_successful=True
+    except Exception as e:
+        display('There was a failure.', 'cyan')
+        record_error(e)
+        exception_message = getattr(e, 'message', repr(e))
+    if is_successful:
+        if int(get_config_value(config, 'pool_size', 0)) > 0:
+            # Top the pool back up without making the user wait
+            subprocess.Popen(
+                [sys.executable, '-m', 'dev_tools.newenv', '--fill-pool'] + (['--offline'] if offline else []),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        if timings:
+            display_timings(step_timings, time.perf_counter() - started)
+        display('Done!', 'bright_green')
+    else:
+        error_message += exception_message
+        if not error_message:
+            error_message = 'An unknown error occurred'
+        display(error_message, 'cyan')
+
+def build_environment(dev_tools_dir, env_path, env_name, env_num, date, author, python=None, offline=False, refresh_seed=False):
+    # Independent steps overlap, e.g. the template is rendered and the git
+    # repository initialised while the virtual environment is cloned.
+    first_name, last_name, contact = author
+    venv = dict()
+
+    def build_path():
+        display('  - Building path...')
         os.makedirs(env_path, exist_ok=True)
-        os.makedirs(temp_dir, exist_ok=True)
-
-        files_to_copy = (dev_tools_dir / 'templates' / 'newenv').iterdir()
-        for i in files_to_copy:
-            if i.is_file():
-                shutil.copy(i,temp_dir)
-            else:
-                shutil.copytree(i, temp_dir/i.stem)
-        placeholders = (
-            ('{{ TIME STAMP }}', date.strftime('%Y-%m-%d_%H-%M-%S')),
-            ('{{ LONG DATE }}', date.strftime('%A, %d %b %Y')),
-            ('{{ YEAR }}', date.strftime('%Y')),
-            ('{{ FIRST_NAME }}', first_name),
-            ('{{ LAST_NAME }}', last_name),
-            ('{{ CONTACT }}', contact),
-            ('{{ ENV_NAME }}', f'project_{env_num}'),
-        )
 
-        display('  - Replacing placeholder filenames...')
-        for path in temp_dir.glob('**/*'):
-            name = path.name
-            for placeholder in placeholders:
-                name = name.replace(placeholder[0], placeholder[1])
-            os.rename(path, path.parent / name)
-
-        display('  - Populating previous info...')
-        for path in temp_dir.glob('**/*.*'):
-            with open(path, 'r+') as _file:
-                contents = ''.join(_file.readlines())
-                for placeholder in placeholders:
-                    contents = contents.replace(placeholder[0], placeholder[1])
-                _file.seek(0)
-                _file.write(contents)
-                _file.truncate()
-
-        files_to_copy = temp_dir.iterdir()
-        for i in files_to_copy:
-            if i.is_file():
-                shutil.copy(i,env_path)
-            else:
-                shutil.copytree(i, env_path/i.stem)
+    def render_environment():
+        display('  - Rendering environment template...')
+        render(
+            dev_tools_dir / 'templates' / 'newenv',
+            get_placeholders(env_name, date, author),
+            env_path,
+            cache_dir=dev_tools_dir / '.template_cache',
+        )
 
+    def initialise_repository():
         display('  - Initializing git repository...')
-        repo = git.Repo.init(env_path)
+        # GitPython is slow to import, so only load it when it is used
+        import git
+        git.Repo.init(env_path)
 
+    def create_venv():
         display(f'  - Creating ./.{env_name}/ virtual environment...')
-        venv_session = virtualenv.cli_run([str(env_path / f'.{env_name}'), '--download', '--quiet'])
+        seed_path = get_seed(
+            get_seeds_dir(dev_tools_dir),
+            get_wheelhouse_dir(dev_tools_dir),
+            python=python,
+            offline=offline,
+            refresh=refresh_seed,
+        )
+        clone_seed(seed_path, env_path / f'.{env_name}', f'.{env_name}')
         venv_bin = list((env_path / f'.{env_name}' / 'bin').iterdir())
         venv_executable = [i for i in venv_bin if re.match(i.stem,'python[^0-9]')]
         if not venv_executable:
             raise Exception('Could not find python executable for this virtual environment')
-        venv_executable = venv_executable[0]
-        venv_python_version = subprocess.run([venv_executable, '--version'], capture_output=True)
+        venv['executable'] = venv_executable[0]
+        venv_python_version = subprocess.run([venv['executable'], '--version'], capture_output=True)
         venv_python_version = venv_python_version.stdout.decode('utf-8')
-        venv_python_version = venv_python_version[7:-1]
+        venv['python_version'] = venv_python_version[7:-1]
 
-        poetry_install_command = [venv_executable, '-m', 'pip', 'install', 'poetry']
-        subprocess.run(poetry_install_command)
-
-        os.chdir(env_path)
+    def initialise_poetry():
+        display('  - Initializing poetry project...')
         subprocess.run([
-            venv_executable,
+            venv['executable'],
             '-m',
             'poetry',
             'init',
+            '--no-interaction',
             '--name',
             env_name,
             '--python',
-            venv_python_version,
+            venv['python_version'],
             '--author',
             f'"{ first_name } { last_name } <{ contact }>"',
             '--description',
             f'"Project ID #{ env_num }: Authored by { first_name } { last_name }"'
-        ])
+        ], cwd=env_path)
 
+    def install_poetry():
+        display('  - Installing poetry project...')
         subprocess.run([
-            venv_executable,
+            venv['executable'],
             '-m',
             'poetry',
             'install'
-        ])
+        ], cwd=env_path)
 
-        is_successful=True
+    return run_steps({
+        'path': (build_path, ()),
+        'template': (render_environment, ('path',)),
+        'git init': (initialise_repository, ('path',)),
+        'venv': (create_venv, ('path',)),
+        'poetry init': (initialise_poetry, ('venv',)),
+        # Installing the project itself needs the package folder from the template
+        'poetry install': (install_poetry, ('poetry init', 'template')),
+    })
+
+def fill_environment_pool(offline=False, timings=False):
+    dev_tools_dir = Path.home() / '.dev-tools'
+    config = load_config(dev_tools_dir)
+    env_dir = get_config_path(config, 'development_dir', Path.home() / 'development/')
+
+    is_successful = False
+    error_message = ''
+
+    pool_size = int(get_config_value(config, 'pool_size', 0))
+    python_versions = get_config_list(config, 'pool_python_versions') or [None]
+    author = get_author(config)
+    env_num = 0
+
+    try:
+        display('~~~ Filling Environment Pool ~~~', 'green')
+        for python_version in python_versions:
+            python = get_python_executable(python_version)
+            pool_dir = get_pool_dir(env_dir, python)
+            os.makedirs(pool_dir, exist_ok=True)
+            lock_path = pool_dir / '.lock'
+            if not acquire_lock(lock_path):
+                display(f'  - {pool_dir.name} is already being filled')
+                continue
+            try:
+                while len(list(pool_dir.glob('pool_*'))) < pool_size:
+                    token = f'pool_{uuid4().hex[:12]}'
+                    build_path = pool_dir / '.building' / token
+                    shutil.rmtree(build_path, ignore_errors=True)
+                    display(f'  - Building {token} for {pool_dir.name}...')
+                    started = time.perf_counter()
+                    step_timings = build_environment(dev_tools_dir, build_path, token, env_num, datetime.now(), author, python=python, offline=offline)
+                    if timings:
+                        display_timings(step_timings, time.perf_counter() - started)
+                    with open(build_path / POOL_MARKER_NAME, 'w') as file:
+                        json.dump({'token': token, 'path': str(build_path)}, file)
+                    os.rename(build_path, pool_dir / token)
+            finally:
+                os.remove(lock_path)
+        is_successful = True
     except Exception as e:
         display('There was a failure.', 'cyan')
+        record_error(e)
         exception_message = getattr(e, 'message', repr(e))
     if is_successful:
         display('Done!', 'bright_green')
@@ -136,5 +233,127 @@ def new_environment(env_name=None):
             error_message = 'An unknown error occurred'
         display(error_message, 'cyan')
 
+def claim_environment(dev_tools_dir, pool_dir, env_path, env_name, date, author):
+    # Moves a ready-made environment into place with a single rename, so two
+    # terminals can never claim the same one, then swaps its placeholder name
+    # and build time for the real ones.
+    if env_path.exists() and any(env_path.iterdir()):
+        return False
+    for candidate in sorted(pool_dir.glob('pool_*')):
+        os.makedirs(env_path.parent, exist_ok=True)
+        try:
+            if env_path.exists():
+                os.rmdir(env_path)
+            os.rename(candidate, env_path)
+        except FileNotFoundError:
+            # Claimed by another terminal first
+            continue
+        personalise_environment(dev_tools_dir, env_path, env_name, date, author)
+        return True
+    return False
+
+def personalise_environment(dev_tools_dir, env_path, env_name, date, author):
+    marker_path = env_path / POOL_MARKER_NAME
+    with open(marker_path, 'r') as file:
+        marker = json.load(file)
+    os.remove(marker_path)
+    token = marker['token']
+    replacements = ((marker['path'], str(env_path)), (token, env_name))
+
+    # Re-render the template with the real name and date
+    template = compile_template(dev_tools_dir / 'templates' / 'newenv', dev_tools_dir / '.template_cache')
+    rendered = render_template(template, get_placeholders(token, date, author))
+    for relative_path in rendered['files']:
+        if (env_path / relative_path).is_file():
+            os.remove(env_path / relative_path)
+    for relative_path in reversed(rendered['dirs']):
+        if (env_path / relative_path).is_dir() and not any((env_path / relative_path).iterdir()):
+            os.rmdir(env_path / relative_path)
+    write_rendered(render_template(template, get_placeholders(env_name, date, author)), env_path)
+
+    for path in env_path.iterdir():
+        if path.is_file():
+            rewrite_file(path, replacements)
+
+    venv_path = env_path / f'.{env_name}'
+    os.rename(env_path / f'.{token}', venv_path)
+    relocate_venv(venv_path, replacements)
+    # The editable install of the project itself is named after it
+    for path in list(venv_path.glob('lib*/**/site-packages/*')) + list(venv_path.glob('Lib/site-packages/*')):
+        if token not in path.name:
+            continue
+        if path.is_dir():
+            for file in path.iterdir():
+                if file.is_file():
+                    rewrite_file(file, replacements)
+        os.rename(path, path.with_name(path.name.replace(token, env_name)))
+
+def get_placeholders(env_name, date, author):
+    first_name, last_name, contact = author
+    return {
+        'TIME STAMP': date.strftime('%Y-%m-%d_%H-%M-%S'),
+        'LONG DATE': date.strftime('%A, %d %b %Y'),
+        'YEAR': date.strftime('%Y'),
+        'FIRST_NAME': first_name,
+        'LAST_NAME': last_name,
+        'CONTACT': contact,
+        'ENV_NAME': env_name,
+    }
+
+def get_author(config):
+    return (
+        get_config_value(config, 'first_name', 'Frankie'),
+        get_config_value(config, 'last_name', 'Homewood'),
+        get_config_value(config, 'email', 'fhomewood98@gmail.com'),
+    )
+
+def get_pool_dir(env_dir, python=None):
+    # Kept next to the environments so claiming one is a same-device rename
+    return env_dir / POOL_DIR_NAME / get_seed_name(python or sys.executable)
+
+def get_python_executable(python_version):
+    # '3.12' -> 'python3.12' on the PATH, anything else is used as given
+    if not python_version:
+        return sys.executable
+    python_version = str(python_version)
+    if re.fullmatch(r'[0-9]+(\.[0-9]+)*', python_version):
+        return shutil.which(f'python{python_version}') or python_version
+    return python_version
+
+def acquire_lock(lock_path):
+    try:
+        descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        with open(lock_path, 'r') as file:
+            pid = file.read().strip()
+        if pid.isdigit() and is_running(int(pid)):
+            return False
+        # Left behind by a run that was killed
+        os.remove(lock_path)
+        return acquire_lock(lock_path)
+    with os.fdopen(descriptor, 'w') as file:
+        file.write(str(os.getpid()))
+    return True
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def display_timings(step_timings, total):
+    # Steps that overlapped add up to more than the wall clock total
+    display('~~~ Timings ~~~', 'green')
+    for name, (start, end) in sorted(step_timings.items(), key=lambda timing: timing[1][0]):
+        display(f'  - {name:<16}{end - start:8.3f}s  from +{start:.3f}s')
+    busy = sum(end - start for start, end in step_timings.values())
+    display(f'  - {"total":<16}{total:8.3f}s  ({busy:.3f}s across all steps)')
+
 def display(message, color='bright_cyan'):
     click.echo(click.style(message, fg=color))
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,155 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A command to search and maintain the notes tree.
+
+import click
+
+from pathlib import Path
+
+from dev_tools.archive import archive_year, get_archive_path
+from dev_tools.config import load_config, get_notes_dirs
+from dev_tools.instrument import profiled, phase, record_error
+from dev_tools.facets import open_facets, get_facets_path, update_facets, query_items, count_items
+from dev_tools.scan import DEFAULT_CHUNK_SIZE
+from dev_tools.search import open_index, get_index_path, update_index, search as search_index
+from dev_tools.walk import scan_roots, get_date_range
+
+@click.group()
+@profiled('notes')
+def cli():
+    pass
+
+
+@cli.command()
+@click.argument('query', nargs=-1, required=True)
+@click.option('--limit', type=int, default=20, help='Most matching lines to show.')
+@click.option('--section', default=None, help='Only match lines under this heading, e.g. "### Decisions".')
+@click.option('--no-refresh', is_flag=True, help='Search the index as it is without checking notes for changes.')
+@click.option('--rebuild', is_flag=True, help='Throw the index away and index every note again.')
+@click.option('--workers', type=int, default=None, help='Processes used to parse notes, 1 disables parallel scanning.')
+@click.option('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Notes handed to a worker at a time.')
+def search(query, limit, section, no_refresh, rebuild, workers, chunk_size):
+    dev_tools_dir = Path.home() / '.dev-tools'
+    notes_dirs = get_notes_dirs(load_config(dev_tools_dir))
+
+    is_successful = False
+    error_message = ''
+    try:
+        index = open_index(get_index_path(dev_tools_dir), rebuild=rebuild)
+        if rebuild or not no_refresh:
+            with phase('refresh index'):
+                stats = scan_roots(notes_dirs)
+                indexed, removed = update_index(index, stats, stats=stats, workers=workers, chunk_size=chunk_size)
+            if indexed or removed:
+                display(f'Indexed {indexed} notes, removed {removed}', 'cyan')
+        with phase('search'):
+            results = search_index(index, ' '.join(query), limit=limit, section=section)
+        if not results:
+            display('No matching notes')
+        for note_path, note_section, line, text in results:
+            note_path = Path(note_path)
+            # Notes of the first root are shown relative to it, shared notes in full
+            if notes_dirs[0] in note_path.parents:
+                note_path = note_path.relative_to(notes_dirs[0])
+            click.echo(
+                click.style(f'{note_path}:{line}', fg='bright_cyan')
+                + click.style(f' {note_section} ', fg='cyan')
+                + text
+                )
+        is_successful = True
+    except Exception as e:
+        display("There was a failure.", "cyan")
+        record_error(e)
+        exception_message = getattr(e, "message", repr(e))
+    if not is_successful:
+        error_message += exception_message
+        if not error_message:
+            error_message = "An unknown error occurred"
+        display(error_message, "cyan")
+
+
+@cli.command()
+@click.argument('kind', type=click.Choice(['decisions', 'actions', 'tags', 'attendees']))
+@click.option('--tag', 'tags', multiple=True, help='Only notes with this tag, can be given more than once.')
+@click.option('--attendee', 'attendees', multiple=True, help='Only notes with this attendee, can be given more than once.')
+@click.option('--since', default=None, help='Only notes on or after this date, e.g. 2026-09-17, 2026-09, 2026 or yesterday.')
+@click.option('--until', default=None, help='Only notes on or before this date, e.g. 2026-09-17, 2026-09, 2026 or today.')
+@click.option('--quarter', default=None, help='Only notes in this quarter, e.g. 2026-Q3.')
+@click.option('--no-refresh', is_flag=True, help='Query the store as it is without checking notes for changes.')
+@click.option('--rebuild', is_flag=True, help='Throw the store away and read every note again.')
+@click.option('--workers', type=int, default=None, help='Processes used to parse notes, 1 disables parallel scanning.')
+@click.option('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Notes handed to a worker at a time.')
+def query(kind, tags, attendees, since, until, quarter, no_refresh, rebuild, workers, chunk_size):
+    dev_tools_dir = Path.home() / '.dev-tools'
+    notes_dirs = get_notes_dirs(load_config(dev_tools_dir))
+
+    is_successful = False
+    error_message = ''
+    try:
+        since, until = get_date_range(since, until, quarter)
+        facets = open_facets(get_facets_path(dev_tools_dir), rebuild=rebuild)
+        if rebuild or not no_refresh:
+            with phase('refresh store'):
+                stats = scan_roots(notes_dirs)
+                updated, removed = update_facets(facets, stats, stats=stats, workers=workers, chunk_size=chunk_size)
+            if updated or removed:
+                display(f'Updated {updated} notes, removed {removed}', 'cyan')
+        # Tags and attendees are counted, decisions and actions are listed
+        kind = kind[:-1]
+        if kind in ('tag', 'attendee'):
+            with phase('query'):
+                results = count_items(facets, kind, tags=tags, attendees=attendees, since=since, until=until)
+            for value, notes in results:
+                display(f'{notes:>5}  {value}')
+        else:
+            with phase('query'):
+                results = query_items(facets, kind, tags=tags, attendees=attendees, since=since, until=until)
+            for note_path, timestamp, value in results:
+                display(f'{timestamp} | {value}')
+        if not results:
+            display('No matching notes')
+        is_successful = True
+    except Exception as e:
+        display("There was a failure.", "cyan")
+        record_error(e)
+        exception_message = getattr(e, "message", repr(e))
+    if not is_successful:
+        error_message += exception_message
+        if not error_message:
+            error_message = "An unknown error occurred"
+        display(error_message, "cyan")
+
+
+@cli.command()
+@click.option('--year', type=int, required=True, help='The year to pack into an archive, it must have ended.')
+def archive(year):
+    # Only the first root is archived, shared roots are left to their owners
+    notes_dir = get_notes_dirs(load_config())[0]
+
+    is_successful = False
+    error_message = ''
+    try:
+        archive_path = get_archive_path(notes_dir, year)
+        display(f'  - Packing {notes_dir / str(year)} into {archive_path.name}...')
+        with phase('archive'):
+            notes, files, unpacked_size, packed_size = archive_year(notes_dir, year)
+        display(f'  - {notes} notes and {files} files packed, {unpacked_size} bytes down to {packed_size}')
+        is_successful = True
+    except Exception as e:
+        display("There was a failure.", "cyan")
+        record_error(e)
+        exception_message = getattr(e, "message", repr(e))
+    if is_successful:
+        display('Done!', 'bright_green')
+    else:
+        error_message += exception_message
+        if not error_message:
+            error_message = "An unknown error occurred"
+        display(error_message, "cyan")
+
+
+def display(message, color="bright_cyan"):
+    click.echo(click.style(message, fg=color))
+
+
+if __name__ == '__main__':
+    cli()
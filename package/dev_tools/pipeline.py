@@ -0,0 +1,62 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# Runs named steps on a thread pool as soon as the steps they depend on have finished.
+
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from dev_tools.instrument import phase
+
+
+class PipelineError(Exception):
+    pass
+
+
+def run_steps(steps, workers=None):
+    # `steps` maps a step name to (function, names of the steps it needs), e.g.
+    #   {'venv': (create_venv, ('path',)), 'path': (make_path, ())}
+    # Returns {name: (start, end)} in seconds from the start of the pipeline, in
+    # the order the steps finished. After a failure no new steps are started,
+    # the running ones are waited for and the first exception is raised.
+    for name, (function, dependencies) in steps.items():
+        unknown = [dependency for dependency in dependencies if dependency not in steps]
+        if unknown:
+            raise PipelineError(f'Step {name!r} depends on unknown steps {unknown}')
+
+    origin = time.perf_counter()
+    timings = dict()
+    pending = dict(steps)
+    running = dict()
+    error = None
+    with ThreadPoolExecutor(max_workers=workers or len(steps) or 1) as executor:
+        while pending or running:
+            if error is None:
+                for name, (function, dependencies) in list(pending.items()):
+                    if all(dependency in timings for dependency in dependencies):
+                        running[executor.submit(time_step, name, function, origin)] = name
+                        del pending[name]
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                start, end, exception = future.result()
+                if exception is None:
+                    timings[name] = (start, end)
+                elif error is None:
+                    error = exception
+    if error is not None:
+        raise error
+    if pending:
+        raise PipelineError(f'Steps {list(pending)} depend on each other and can never run')
+    return timings
+
+
+def time_step(name, function, origin):
+    start = time.perf_counter() - origin
+    try:
+        with phase(name):
+            function()
+    except Exception as e:
+        return start, time.perf_counter() - origin, e
+    return start, time.perf_counter() - origin, None
@@ -0,0 +1,32 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# Shared helpers to parse batches of notes files across worker processes.
+
+import os
+
+from itertools import repeat
+
+DEFAULT_CHUNK_SIZE = 64
+
+
+def scan_files(parse, files, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Yields (file, parse(file)) pairs in the same order as `files`.
+    # `parse` must be a module level function so it can be sent to a worker.
+    # workers=None picks the core count, workers=1 always parses in-process.
+    files = list(files)
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(chunk_size, 1)
+    if workers == 1 or len(files) <= chunk_size:
+        for file in files:
+            yield file, parse(file)
+        return
+
+    # Only imported here, multiprocessing is slow to load for small scans
+    from concurrent.futures import ProcessPoolExecutor
+    chunks = [files[start:start + chunk_size] for start in range(0, len(files), chunk_size)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        for chunk, results in zip(chunks, executor.map(parse_chunk, repeat(parse), chunks)):
+            yield from zip(chunk, results)
+
+
+def parse_chunk(parse, files):
+    return [parse(file) for file in files]
@@ -0,0 +1,129 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A persistent full text index of every line of every note, kept up to date from file signatures.
+
+import re
+
+from dev_tools.archive import open_note
+from dev_tools.scan import DEFAULT_CHUNK_SIZE
+from dev_tools.sections import HEADING_REGEX
+from dev_tools.sidecar import open_sidecar, update_sidecar
+
+# Each line is stored under rowid (note_id << LINE_BITS) + line number, so all
+# of a note's lines can be dropped with one rowid range when it changes.
+LINE_BITS = 20
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    note_id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    signature TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5(
+    text,
+    section UNINDEXED,
+    tokenize = 'unicode61'
+);
+"""
+SCHEMA_VERSION = 1
+
+QUERY_REGEX = re.compile(r'"([^"]*)"|(\S+)')
+TOKEN_REGEX = re.compile(r'\w+')
+
+
+def get_index_path(dev_tools_dir):
+    return dev_tools_dir / 'dot-files' / '.dtsearch.db'
+
+
+def open_index(file_path, rebuild=False):
+    return open_sidecar(file_path, SCHEMA, SCHEMA_VERSION, ('notes', 'lines'), rebuild=rebuild)
+
+
+def update_index(connection, files, stats=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Returns the number of notes indexed and removed
+    return update_sidecar(
+        connection, files, get_note_lines, insert_note, delete_note,
+        stats=stats, workers=workers, chunk_size=chunk_size,
+        )
+
+
+def insert_note(connection, file, signature, note_lines):
+    note_id = connection.execute(
+        'INSERT INTO notes (path, signature) VALUES (?, ?)',
+        (str(file), signature),
+        ).lastrowid
+    connection.executemany(
+        'INSERT INTO lines (rowid, text, section) VALUES (?, ?, ?)',
+        (((note_id << LINE_BITS) + line, text, section) for section, line, text in note_lines),
+        )
+
+
+def delete_note(connection, note_id):
+    connection.execute(
+        'DELETE FROM lines WHERE rowid BETWEEN ? AND ?',
+        (note_id << LINE_BITS, ((note_id + 1) << LINE_BITS) - 1),
+        )
+    connection.execute('DELETE FROM notes WHERE note_id = ?', (note_id,))
+
+
+def search(connection, query, limit=20, section=None):
+    # Returns (note path, section, line number, text) for the best matching
+    # lines, best first. Words must all appear on the line, "quoted words" must
+    # appear together and a trailing * matches any word starting with the rest.
+    match_query = get_match_query(query)
+    if not match_query:
+        return list()
+    sql = (
+        'SELECT notes.path, lines.section, lines.rowid, lines.text FROM lines'
+        ' JOIN notes ON notes.note_id = lines.rowid >> ?'
+        ' WHERE lines MATCH ?'
+        )
+    parameters = [LINE_BITS, match_query]
+    if section:
+        sql += ' AND lines.section = ?'
+        parameters.append(section)
+    # Ties go to the most recent note, note names start with their timestamp
+    sql += ' ORDER BY bm25(lines), notes.path DESC LIMIT ?'
+    parameters.append(limit)
+    return [
+        (path, line_section, rowid & ((1 << LINE_BITS) - 1), text)
+        for path, line_section, rowid, text in connection.execute(sql, parameters)
+        ]
+
+
+def get_match_query(query):
+    # Builds an FTS5 query from plain words so that punctuation in a query is
+    # never read as FTS5 syntax, e.g.
+    #   'deploy "release notes" conf*' -> '"deploy" "release notes" "conf" *'
+    terms = list()
+    for phrase, word in QUERY_REGEX.findall(query):
+        tokens = get_tokens(phrase or word)
+        if not tokens:
+            continue
+        if phrase:
+            terms.append('"' + ' '.join(tokens) + '"')
+            continue
+        terms += [f'"{token}"' for token in tokens]
+        if word.endswith('*'):
+            terms[-1] += ' *'
+    return ' '.join(terms)
+
+
+def get_note_lines(file):
+    # Returns (section heading, line number, text) for every non blank line of
+    # a note, line numbers counting from 1. Headings belong to their own section.
+    note_lines = list()
+    section = ''
+    with open_note(file, encoding='utf-8', errors='replace') as note:
+        for line_number, line in enumerate(note, start=1):
+            if line_number >= 1 << LINE_BITS:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            if HEADING_REGEX.match(line):
+                section = line
+            note_lines.append((section, line_number, line))
+    return note_lines
+
+
+def get_tokens(text):
+    return TOKEN_REGEX.findall(text.lower())
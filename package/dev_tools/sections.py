@@ -0,0 +1,84 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A single pass, line oriented parser for the markdown sections of notes files.
+
+import itertools
+import re
+
+from dev_tools.archive import open_note, read_indexed_sections
+from dev_tools.instrument import count
+
+HEADING_REGEX = re.compile(r'^#{1,6} ')
+TITLE_READ_LIMIT = 1024
+
+
+def iter_sections(lines):
+    # Yields (heading, body) pairs in document order from any iterable of lines,
+    # so an open file is consumed lazily and can be abandoned part way through.
+    # Text before the first heading is yielded under the empty heading ''.
+    heading = ''
+    body = list()
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if HEADING_REGEX.match(line):
+            yield heading, '\n'.join(body)
+            heading = line.strip()
+            body = list()
+        else:
+            body.append(line)
+    yield heading, '\n'.join(body)
+
+
+def parse_sections(lines, wanted=None):
+    # Returns {heading: body}, e.g. {'### Actions': '- first\n- second\n'}.
+    # When `wanted` is given, parsing stops as soon as all of them are found.
+    # Repeated headings keep the body of their first occurrence.
+    wanted = set(wanted) if wanted else None
+    sections = dict()
+    for heading, body in iter_sections(lines):
+        if wanted is not None and heading not in wanted:
+            continue
+        sections.setdefault(heading, body)
+        if wanted is not None and wanted.issubset(sections):
+            break
+    return sections
+
+
+def read_sections(path, wanted=None):
+    # Notes parsed in worker processes are not counted
+    indexed = read_indexed_sections(path, wanted)
+    if indexed is not None:
+        return indexed
+    with open_note(path) as file:
+        sections = parse_sections(file, wanted=wanted)
+        count('bytes read', file.buffer.tell())
+    return sections
+
+
+def read_titled_sections(path, wanted=None):
+    # Returns (title, sections), the title read in the same pass as the sections
+    indexed = read_indexed_sections(path, wanted)
+    if indexed is not None:
+        return read_title(path), indexed
+    with open_note(path) as file:
+        first_line = file.readline()
+        sections = parse_sections(itertools.chain([first_line], file), wanted=wanted)
+        count('bytes read', file.buffer.tell())
+    return (first_line.strip() if HEADING_REGEX.match(first_line) else ''), sections
+
+
+def read_title(path, limit=TITLE_READ_LIMIT):
+    # The first line of a note when it is a heading, e.g. '# _MEETING_ <br/> Monday, 01 Jan 2024'.
+    # At most `limit` characters are read so huge notes cost the same as small ones.
+    with open_note(path) as file:
+        line = file.readline(limit)
+        count('bytes read', file.buffer.tell())
+    return line.strip() if HEADING_REGEX.match(line) else ''
+
+
+def get_list_items(body):
+    # The text of each '- item' line in a section body, skipping empty items.
+    return [
+        match.group(1)
+        for match in (re.match(r'- (.+)', line) for line in body.split('\n'))
+        if match
+        ]
@@ -0,0 +1,157 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A cache of prebuilt virtual environments that new environments are cloned from.
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+SEED_PROMPT = '__DEV_TOOLS_SEED__'
+SEED_PACKAGES = ['poetry']
+TEXT_FILE_LIMIT = 1024 * 1024
+
+
+def get_seeds_dir(dev_tools_dir):
+    return dev_tools_dir / '.seeds'
+
+
+def get_wheelhouse_dir(dev_tools_dir):
+    return dev_tools_dir / 'wheelhouse'
+
+
+def get_seed(seeds_dir, wheelhouse_dir, python=None, offline=False, refresh=False):
+    # Returns the seed venv for a python version, building it when it is missing.
+    # Seeds are built in a scratch folder and moved into place in one rename, so
+    # an interrupted build or a second terminal never sees a half built seed.
+    python = python or sys.executable
+    seed_path = seeds_dir / get_seed_name(python) / 'venv'
+    if seed_path.is_dir() and not refresh:
+        return seed_path
+
+    if refresh and not offline:
+        fill_wheelhouse(wheelhouse_dir, python)
+    build_path = seed_path.parent / f'build.{os.getpid()}'
+    shutil.rmtree(build_path, ignore_errors=True)
+    os.makedirs(build_path.parent, exist_ok=True)
+    try:
+        build_seed(build_path, wheelhouse_dir, python, offline=offline)
+        if seed_path.is_dir():
+            retired_path = seed_path.parent / f'retired.{os.getpid()}'
+            os.rename(seed_path, retired_path)
+            shutil.rmtree(retired_path, ignore_errors=True)
+        os.rename(build_path, seed_path)
+    finally:
+        shutil.rmtree(build_path, ignore_errors=True)
+    return seed_path
+
+
+def build_seed(seed_path, wheelhouse_dir, python, offline=False):
+    # Embedded wheels are used for pip and setuptools so nothing is downloaded
+    # for the venv itself. Poetry comes from the wheelhouse when it has wheels.
+    arguments = [str(seed_path), '--python', python, '--prompt', SEED_PROMPT, '--no-download', '--quiet']
+    has_wheels = wheelhouse_dir.is_dir() and any(wheelhouse_dir.iterdir())
+    if has_wheels:
+        arguments += ['--extra-search-dir', str(wheelhouse_dir)]
+    # Only needed when a seed is missing, clones never load it
+    import virtualenv
+    virtualenv.cli_run(arguments)
+
+    install_command = [get_venv_python(seed_path), '-m', 'pip', 'install', '--quiet', '--disable-pip-version-check']
+    if has_wheels:
+        install_command += ['--find-links', str(wheelhouse_dir)]
+    if offline:
+        install_command += ['--no-index']
+    subprocess.run(install_command + SEED_PACKAGES, check=True)
+
+    with open(seed_path / 'seed.json', 'w') as file:
+        # Scripts keep the path the seed was built at, which clones replace
+        json.dump({'source': str(seed_path), 'python': python}, file)
+
+
+def fill_wheelhouse(wheelhouse_dir, python):
+    # Downloads the seed packages and their dependencies so seeds can later be
+    # rebuilt without a network connection.
+    os.makedirs(wheelhouse_dir, exist_ok=True)
+    subprocess.run(
+        [python, '-m', 'pip', 'download', '--quiet', '--disable-pip-version-check', '--dest', str(wheelhouse_dir)]
+        + SEED_PACKAGES,
+        check=True,
+        )
+
+
+def clone_seed(seed_path, venv_path, prompt):
+    # Hard links every file of the seed into `venv_path`, falling back to a copy
+    # across devices, then rewrites the files that mention the seed's location.
+    with open(seed_path / 'seed.json', 'r') as file:
+        source = json.load(file)['source']
+    shutil.copytree(seed_path, venv_path, symlinks=True, copy_function=link_or_copy)
+    os.remove(venv_path / 'seed.json')
+
+    relocate_venv(venv_path, ((source, str(venv_path)), (SEED_PROMPT, prompt)))
+    return venv_path
+
+
+def relocate_venv(venv_path, replacements):
+    # Applies (old, new) string replacements to every file of a venv that can
+    # hold its own path or prompt.
+    for path in get_relocatable_files(venv_path):
+        rewrite_file(path, replacements)
+
+
+def rewrite_file(path, replacements):
+    # Rewritten files are unlinked first so any hard linked original is never modified.
+    with open(path, 'rb') as file:
+        contents = file.read()
+    rewritten = contents
+    for old, new in replacements:
+        rewritten = rewritten.replace(old.encode('utf-8'), new.encode('utf-8'))
+    if rewritten == contents:
+        return False
+    mode = os.stat(path).st_mode
+    os.remove(path)
+    with open(path, 'wb') as file:
+        file.write(rewritten)
+    os.chmod(path, mode)
+    return True
+
+
+def get_relocatable_files(venv_path):
+    # Entry point scripts, activate scripts, pyvenv.cfg and .pth files are the
+    # only files in a venv that hold absolute paths to it.
+    yield venv_path / 'pyvenv.cfg'
+    for scripts_dir in (venv_path / 'bin', venv_path / 'Scripts'):
+        if scripts_dir.is_dir():
+            for path in scripts_dir.iterdir():
+                if path.is_file() and not path.is_symlink() and os.path.getsize(path) < TEXT_FILE_LIMIT:
+                    yield path
+    for path in venv_path.glob('lib*/**/site-packages/*.pth'):
+        yield path
+    for path in venv_path.glob('Lib/site-packages/*.pth'):
+        yield path
+
+
+def link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+    return destination
+
+
+def get_venv_python(venv_path):
+    if (venv_path / 'Scripts').is_dir():
+        return str(venv_path / 'Scripts' / 'python.exe')
+    return str(venv_path / 'bin' / 'python')
+
+
+def get_seed_name(python):
+    # One seed per interpreter version, e.g. 'python3.11'
+    if python == sys.executable:
+        return f'python{sys.version_info[0]}.{sys.version_info[1]}'
+    version = subprocess.run(
+        [python, '-c', 'import sys; print("%d.%d" % sys.version_info[:2])'],
+        capture_output=True,
+        check=True,
+        )
+    return f"python{version.stdout.decode('utf-8').strip()}"
@@ -0,0 +1,73 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# Shared helpers for SQLite stores that only hold what can be read again from the notes.
+
+import os
+import sqlite3
+
+from dev_tools.archive import stat_note
+from dev_tools.instrument import count
+from dev_tools.scan import scan_files, DEFAULT_CHUNK_SIZE
+from dev_tools.store import transaction
+
+
+def open_sidecar(file_path, schema, schema_version, tables, rebuild=False):
+    # `tables` are dropped and created again from `schema` on a rebuild or a
+    # new `schema_version`, as the notes can always fill them again
+    os.makedirs(file_path.parent, exist_ok=True)
+    connection = sqlite3.connect(file_path, timeout=30, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    if rebuild or connection.execute('PRAGMA user_version').fetchone()[0] != schema_version:
+        with transaction(connection):
+            for table in tables:
+                connection.execute(f'DROP TABLE IF EXISTS {table}')
+            # executescript would commit the transaction part way through
+            for statement in schema.split(';'):
+                if statement.strip():
+                    connection.execute(statement)
+            connection.execute(f'PRAGMA user_version = {schema_version}')
+    return connection
+
+
+def update_sidecar(
+    connection, files, parse, insert_note, delete_note,
+    stats=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, include=None,
+):
+    # Re-reads notes whose (mtime_ns, size, inode) signature has changed and
+    # drops notes that no longer exist, from a `notes (note_id, path, signature)`
+    # table. Stale notes are parsed with `parse` across workers, then stored
+    # with insert_note(connection, file, signature, parsed) once their old rows
+    # are gone through delete_note(connection, note_id). `include` picks the
+    # files that count as notes and `stats` holds the stat of notes already
+    # scanned. Returns the number of notes updated and removed.
+    stored = {
+        path: (note_id, signature)
+        for note_id, path, signature in connection.execute('SELECT note_id, path, signature FROM notes')
+        }
+    seen = set()
+    stale_files = list()
+    for file in files:
+        if include and not include(file):
+            continue
+        stat = stats[file] if stats else stat_note(file)
+        count("files stat'ed")
+        signature = f'{stat.st_mtime_ns}:{stat.st_size}:{stat.st_ino}'
+        seen.add(str(file))
+        entry = stored.get(str(file))
+        if not entry or entry[1] != signature:
+            stale_files.append((file, signature))
+    removed = [path for path in stored if path not in seen]
+    if not stale_files and not removed:
+        return 0, 0
+
+    signatures = dict((str(file), signature) for file, signature in stale_files)
+    parsed = scan_files(parse, [file for file, _ in stale_files], workers=workers, chunk_size=chunk_size)
+    with transaction(connection):
+        for path in removed:
+            delete_note(connection, stored[path][0])
+        for file, result in parsed:
+            entry = stored.get(str(file))
+            if entry:
+                delete_note(connection, entry[0])
+            insert_note(connection, file, signatures[str(file)], result)
+    return len(stale_files), len(removed)
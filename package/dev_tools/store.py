@@ -0,0 +1,515 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A SQLite backed store for the open and closed state of actions.
+
+import json
+import os
+import re
+import sqlite3
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS actions (
+    action TEXT PRIMARY KEY,
+    action_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    note_path TEXT,
+    state TEXT NOT NULL DEFAULT 'open',
+    opened_at TEXT NOT NULL,
+    closed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS actions_by_state ON actions (state, action_id);
+CREATE INDEX IF NOT EXISTS actions_by_id ON actions (action_id);
+CREATE TABLE IF NOT EXISTS action_tokens (
+    token TEXT NOT NULL,
+    action TEXT NOT NULL,
+    PRIMARY KEY (token, action)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS action_events (
+    event_id INTEGER PRIMARY KEY,
+    action TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    at TEXT NOT NULL,
+    note_path TEXT,
+    series TEXT NOT NULL,
+    tags TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS action_events_by_action ON action_events (action, kind, event_id);
+CREATE TABLE IF NOT EXISTS action_weeks (
+    week TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    name TEXT NOT NULL,
+    opened INTEGER NOT NULL DEFAULT 0,
+    closed INTEGER NOT NULL DEFAULT 0,
+    carried INTEGER NOT NULL DEFAULT 0,
+    dropped INTEGER NOT NULL DEFAULT 0,
+    days_to_close INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, week, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS open_actions_by_day (
+    day TEXT PRIMARY KEY,
+    actions INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+SCHEMA_VERSION = 2
+
+# Actions leave the open backlog by being closed, carried into a new daily
+# note or deleted from their note while still open
+EVENT_KINDS = ('opened', 'closed', 'carried', 'dropped')
+QUERY_CHUNK_SIZE = 500
+
+ACTION_ID_REGEX = re.compile(r'^[0-9]{4}-[0-9_-]*$')
+SERIES_TITLE_REGEX = re.compile(r'^# (.*?)\s*<')
+SERIES_NAME_REGEX = re.compile(r'^[0-9]{4}-[0-9]{2}-[0-9]{2}_[0-9]{2}-[0-9]{2}-[0-9]{2}(?: - )?')
+PLAIN_TEXT_REGEX = re.compile(r'^[\w\s\'"-]+$')
+NUMBERS_REGEX = re.compile(r'^[0-9\s_-]+$')
+TOKEN_REGEX = re.compile(r'\w+')
+
+
+def get_store_path(dev_tools_dir):
+    return dev_tools_dir / 'dot-files' / '.dtactions.db'
+
+
+def open_store(file_path):
+    # Every command opens its own connection. WAL mode and immediate write
+    # transactions let several terminals read and write without losing updates.
+    os.makedirs(file_path.parent, exist_ok=True)
+    connection = sqlite3.connect(file_path, timeout=30, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    migrate_schema(connection)
+    migrate_actions_file(connection, file_path.parent / '.dtactions')
+    return connection
+
+
+@contextmanager
+def transaction(connection):
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield connection
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def migrate_schema(connection):
+    if connection.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+        return
+    with transaction(connection):
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        if version < 1:
+            # Stores created before the token index existed
+            index_tokens(connection, get_open_actions(connection))
+        if version < 2:
+            # Stores created before the event log existed start it from the
+            # actions they hold, actions already dropped are not known
+            backfill_events(connection)
+        connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+
+def migrate_actions_file(connection, file_path):
+    # Imports a legacy `.dtactions` JSON file once, then moves it aside.
+    if not file_path.is_file():
+        return
+    with transaction(connection):
+        if not file_path.is_file():
+            # Another invocation migrated it while we waited for the lock
+            return
+        with open(file_path, 'r') as file:
+            try:
+                actions_file = json.load(file)
+            except ValueError:
+                actions_file = dict()
+        now = get_now()
+        events = list()
+        for state, key in (('closed', 'closed'), ('open', 'active')):
+            for action in actions_file.get(key) or list():
+                cursor = connection.execute(
+                    'INSERT OR IGNORE INTO actions (action, action_id, text, state, opened_at, closed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (*split_action(action), state, now, now if state == 'closed' else None)
+                    )
+                if cursor.rowcount:
+                    events.append((action, 'opened', get_action_time(action), None, '', ()))
+                    if state == 'closed':
+                        events.append((action, 'closed', now, None, '', ()))
+        append_events(connection, events)
+        index_tokens(connection, actions_file.get('active') or list())
+        os.replace(file_path, file_path.with_name('.dtactions.migrated'))
+
+
+def sync_actions(connection, scanned_actions, since=None, until=None, notes=None, missing_dirs=()):
+    # `scanned_actions` maps every action found in the notes to its note path.
+    # New actions are opened, open actions no longer in any note are dropped
+    # and closed history is left untouched. Given a [since, until) range only
+    # the notes in it were scanned, so open actions of other notes are kept.
+    # Returns the number of actions opened and dropped. `notes` maps note
+    # paths to the {'series', 'tags'} their actions are logged with. Notes
+    # under `missing_dirs`, roots that could not be reached like an unmounted
+    # network drive, were not scanned either, so their actions are kept open.
+    now = get_now()
+    notes = notes or dict()
+    with transaction(connection):
+        open_actions = get_open_actions(connection, since=since, until=until)
+        candidates = [action for action in scanned_actions if action not in open_actions]
+        # Closed actions are never reopened
+        closed_actions = get_stored_actions(connection, candidates)
+        new_actions = [action for action in candidates if action not in closed_actions]
+        connection.executemany(
+            'INSERT INTO actions (action, action_id, text, note_path, opened_at) VALUES (?, ?, ?, ?, ?)',
+            [(*split_action(action), scanned_actions[action], now) for action in new_actions]
+            )
+        index_tokens(connection, new_actions)
+        removed_actions = [action for action in open_actions if action not in scanned_actions]
+        if missing_dirs:
+            prefixes = tuple(os.path.join(str(notes_dir), '') for notes_dir in missing_dirs)
+            note_paths = get_note_paths(connection, removed_actions)
+            removed_actions = [action for action in removed_actions if not note_paths[action].startswith(prefixes)]
+        connection.executemany(
+            "DELETE FROM actions WHERE action = ? AND state = 'open'",
+            [(action,) for action in removed_actions]
+            )
+        unindex_tokens(connection, removed_actions)
+        series = dict()
+        events = list()
+        for action in new_actions:
+            note_path = scanned_actions[action]
+            note = notes.get(note_path) or dict()
+            if note_path not in series:
+                series[note_path] = note['series'] if 'series' in note else get_series(note_path)
+            events.append((
+                action, 'opened', get_action_time(action), note_path, series[note_path], note.get('tags') or (),
+                ))
+        append_events(connection, events + get_closing_events(connection, removed_actions, 'dropped', now))
+    return len(new_actions), len(removed_actions)
+
+
+def get_open_actions(connection, since=None, until=None):
+    # Action ids start with their note's timestamp, so a [since, until) range
+    # of timestamps is a range of the (state, action_id) index
+    rows = connection.execute(
+        "SELECT action FROM actions WHERE state = 'open' AND action_id >= ? AND action_id < ? ORDER BY action_id",
+        (since or '', until or '~'),
+        )
+    return dict.fromkeys(action for action, in rows)
+
+
+def get_closed_actions(connection, since=None, until=None):
+    # Only the closed actions of notes in a [since, until) range of timestamps,
+    # read through the (state, action_id) index as get_open_actions is
+    rows = connection.execute(
+        "SELECT action FROM actions WHERE state = 'closed' AND action_id >= ? AND action_id < ?",
+        (since or '', until or '~'),
+        )
+    return set(action for action, in rows)
+
+
+def close_actions(connection, actions, kind='closed'):
+    # Actions carried into a new daily note are closed with the 'carried' kind,
+    # so they are not counted as done
+    now = get_now()
+    with transaction(connection):
+        closed_actions = get_stored_actions(connection, actions, state='open')
+        connection.executemany(
+            "UPDATE actions SET state = 'closed', closed_at = ? WHERE action = ? AND state = 'open'",
+            [(now, action) for action in closed_actions]
+            )
+        unindex_tokens(connection, actions)
+        append_events(connection, get_closing_events(connection, closed_actions, kind, now))
+
+
+def get_stored_actions(connection, actions, state='closed'):
+    # Returns those of `actions` in the store in `state`, looked up a chunk of
+    # actions per statement rather than one at a time
+    actions = list(actions)
+    stored = dict()
+    for chunk in get_chunks(actions):
+        rows = connection.execute(
+            f'SELECT action FROM actions WHERE state = ? AND action IN ({", ".join("?" * len(chunk))})',
+            (state, *chunk)
+            )
+        stored.update((action, None) for action, in rows)
+    return dict.fromkeys(action for action in actions if action in stored)
+
+
+def get_note_paths(connection, actions):
+    # Returns the note path of each of `actions`, a chunk of actions per statement
+    note_paths = dict()
+    for chunk in get_chunks(actions):
+        rows = connection.execute(
+            f'SELECT action, note_path FROM actions WHERE action IN ({", ".join("?" * len(chunk))})', chunk
+            )
+        note_paths.update(rows)
+    return note_paths
+
+
+def get_chunks(values):
+    # Keeps each statement well under SQLite's limit on bound parameters
+    values = list(values)
+    return [values[start:start + QUERY_CHUNK_SIZE] for start in range(0, len(values), QUERY_CHUNK_SIZE)]
+
+
+def backfill_events(connection):
+    # Logs the opening of every action in the store, and the closing of those
+    # since closed, as if the log had always been kept
+    rows = connection.execute('SELECT action, note_path, state, closed_at FROM actions ORDER BY action_id').fetchall()
+    events = list()
+    for action, note_path, state, closed_at in rows:
+        events.append((action, 'opened', get_action_time(action), note_path, get_series(note_path), ()))
+        if state == 'closed':
+            events.append((action, 'closed', closed_at or get_now(), note_path, get_series(note_path), ()))
+    append_events(connection, events)
+
+
+def get_closing_events(connection, actions, kind, at):
+    # Closing events carry the note, series and tags the action was latest
+    # opened with, read for a chunk of actions per statement
+    actions = list(actions)
+    opened = dict()
+    for chunk in get_chunks(actions):
+        rows = connection.execute(
+            'SELECT action, note_path, series, tags FROM action_events '
+            f"WHERE kind = 'opened' AND action IN ({', '.join('?' * len(chunk))}) ORDER BY event_id",
+            chunk
+            )
+        opened.update((action, row) for action, *row in rows)
+    events = list()
+    for action in actions:
+        note_path, series, tags = opened.get(action) or (None, '', '[]')
+        events.append((action, kind, at, note_path, series, json.loads(tags)))
+    return events
+
+
+def append_events(connection, events):
+    # Appends (action, kind, at, note path, series, tags) events to the log and
+    # adds them to the weekly and open backlog aggregates in the same
+    # transaction, so the aggregates never need the log replayed
+    # Actions of a note share their tags, so each set is serialised once
+    serialised = dict()
+    rows = list()
+    for action, kind, at, note_path, series, tags in events:
+        tags = tuple(tags)
+        if tags not in serialised:
+            serialised[tags] = json.dumps(list(tags))
+        rows.append((action, kind, at, note_path, series, serialised[tags]))
+    connection.executemany(
+        'INSERT INTO action_events (action, kind, at, note_path, series, tags) VALUES (?, ?, ?, ?, ?, ?)',
+        rows
+        )
+    aggregate_events(connection, [(action, kind, at, series, tags) for action, kind, at, _, series, tags in events])
+
+
+def aggregate_events(connection, events):
+    # Adds (action, kind, at, series, tags) events to the counts of their week,
+    # by series and by tag, and to the open actions of the day each was opened.
+    # `kind` is one of EVENT_KINDS, and so a column of action_weeks.
+    # Actions of a note are opened and mostly closed together, so the events
+    # are counted once per note, kind and time rather than once each
+    groups = dict()
+    for action, kind, at, series, tags in events:
+        key = (kind, at, action[:19], series, tuple(tags))
+        groups[key] = groups.get(key, 0) + 1
+    weeks = dict()
+    days = dict()
+    for (kind, at, note_time, series, tags), count in groups.items():
+        opened_at = get_action_time(note_time)
+        days_to_close = max((parse_time(at) - parse_time(opened_at)).days, 0) if kind == 'closed' else 0
+        week = get_week(at)
+        for key in [('series', week, series)] + [('tag', week, tag) for tag in dict.fromkeys(tags)]:
+            totals = weeks.setdefault(key, dict.fromkeys(EVENT_KINDS + ('days_to_close',), 0))
+            totals[kind] += count
+            totals['days_to_close'] += days_to_close * count
+        days[opened_at[:10]] = days.get(opened_at[:10], 0) + (count if kind == 'opened' else -count)
+    connection.executemany(
+        'INSERT INTO action_weeks (dimension, week, name, opened, closed, carried, dropped, days_to_close) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (dimension, week, name) DO UPDATE SET '
+        'opened = opened + excluded.opened, closed = closed + excluded.closed, '
+        'carried = carried + excluded.carried, dropped = dropped + excluded.dropped, '
+        'days_to_close = days_to_close + excluded.days_to_close',
+        [(*key, *totals.values()) for key, totals in weeks.items()]
+        )
+    connection.executemany(
+        'INSERT INTO open_actions_by_day (day, actions) VALUES (?, ?) '
+        'ON CONFLICT (day) DO UPDATE SET actions = actions + excluded.actions',
+        list(days.items())
+        )
+
+
+def rebuild_aggregates(connection):
+    # The aggregates only hold what the event log already says
+    with transaction(connection):
+        connection.execute('DELETE FROM action_weeks')
+        connection.execute('DELETE FROM open_actions_by_day')
+        rows = connection.execute('SELECT action, kind, at, series, tags FROM action_events ORDER BY event_id')
+        aggregate_events(connection, [
+            (action, kind, at, series, json.loads(tags)) for action, kind, at, series, tags in rows.fetchall()
+            ])
+
+
+def get_open_ages(connection, today, buckets):
+    # Returns the number of open actions opened within each of `buckets` days
+    # of `today`, then the number older than the last bucket
+    cutoffs = [(today - timedelta(days=days)).isoformat() for days in buckets]
+    counts = list()
+    upper = '~'
+    for cutoff in cutoffs:
+        counts.append(get_open_count(connection, cutoff, upper))
+        upper = cutoff
+    counts.append(get_open_count(connection, '', upper))
+    return counts
+
+
+def get_open_count(connection, since, until):
+    row = connection.execute(
+        'SELECT COALESCE(SUM(actions), 0) FROM open_actions_by_day WHERE day >= ? AND day < ?', (since, until)
+        ).fetchone()
+    return row[0]
+
+
+def get_weekly_totals(connection, dimension, since_week):
+    # Returns (week, name, opened, closed, carried, dropped, days to close) for
+    # every week from `since_week` on, newest first
+    rows = connection.execute(
+        'SELECT week, name, opened, closed, carried, dropped, days_to_close FROM action_weeks '
+        'WHERE dimension = ? AND week >= ? ORDER BY week DESC, opened + closed DESC, name',
+        (dimension, since_week)
+        )
+    return rows.fetchall()
+
+
+def find_actions(connection, pattern):
+    # Resolves a pattern against the open actions, cheapest lookup first:
+    #   - a whole action line, as printed by `actions`
+    #   - a whole action id, or else an id or timestamp prefix, e.g. '2024-01-01_09'
+    #   - plain words, each matching the start of a word in the action text
+    #   - anything else, like a bare year that may be part of an id, or words
+    #     no action text starts with, is treated as a regex over every open action
+    # Matches are listed in note order, then by their index in the note.
+    pattern = pattern.strip()
+    if not pattern:
+        return list()
+    row = connection.execute(
+        "SELECT action FROM actions WHERE action = ? AND state = 'open'", (pattern,)
+        ).fetchone()
+    if row:
+        return [row[0]]
+    if ACTION_ID_REGEX.match(pattern):
+        # A whole id, e.g. from `actions --format ndjson`, is also the prefix of
+        # ids like its _10 and _100, so it is looked up exactly first. An id
+        # already closed matches nothing rather than its longer neighbours.
+        rows = connection.execute('SELECT action, state FROM actions WHERE action_id = ?', (pattern,)).fetchall()
+        if rows:
+            return [action for action, state in rows if state == 'open']
+        rows = connection.execute(
+            "SELECT action FROM actions WHERE state = 'open' AND action_id >= ? AND action_id < ?",
+            (pattern, get_prefix_upper_bound(pattern))
+            )
+        return sorted((action for action, in rows), key=get_action_order)
+    tokens = get_tokens(pattern)
+    if tokens and PLAIN_TEXT_REGEX.match(pattern) and not NUMBERS_REGEX.match(pattern):
+        candidates = find_token_matches(connection, tokens)
+        if candidates:
+            return sorted(candidates, key=get_action_order)
+    return sorted(
+        (action for action in get_open_actions(connection) if re.search(pattern, action)), key=get_action_order
+        )
+
+
+def find_token_matches(connection, tokens):
+    # The open actions with a word starting with each of `tokens`
+    candidates = None
+    for token in tokens:
+        rows = connection.execute(
+            'SELECT action FROM action_tokens WHERE token >= ? AND token < ?',
+            (token, get_prefix_upper_bound(token))
+            )
+        matches = set(action for action, in rows)
+        candidates = matches if candidates is None else candidates & matches
+        if not candidates:
+            return set()
+    return candidates
+
+
+def get_action_order(action):
+    # '2024-01-01_09-00-00_10 | ...' -> ('2024-01-01_09-00-00', 10), so _10
+    # sorts after _2
+    timestamp, _, index = split_action(action)[1].rpartition('_')
+    return (timestamp, int(index)) if index.isdigit() else (split_action(action)[1], -1)
+
+
+def index_tokens(connection, actions):
+    connection.executemany(
+        'INSERT OR IGNORE INTO action_tokens (token, action) VALUES (?, ?)',
+        [
+            (token, action)
+            for action in actions
+            for token in set(get_tokens(split_action(action)[2]))
+            ]
+        )
+
+
+def unindex_tokens(connection, actions):
+    connection.executemany(
+        'DELETE FROM action_tokens WHERE token = ? AND action = ?',
+        [
+            (token, action)
+            for action in actions
+            for token in set(get_tokens(split_action(action)[2]))
+            ]
+        )
+
+
+def get_tokens(text):
+    return TOKEN_REGEX.findall(text.lower())
+
+
+def get_prefix_upper_bound(prefix):
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def get_series(note_path, title=''):
+    # The meeting a note belongs to, from its name or, before `title` has
+    # named it, its title heading:
+    #   '2024-01-01_09-00-00 - Sync.md' -> 'Sync'
+    #   '# Sync <br/> Monday, 01 Jan 2024' -> 'Sync'
+    # Notes still called _MEETING_ belong to none.
+    if note_path:
+        name = os.path.splitext(os.path.basename(note_path))[0]
+        series = SERIES_NAME_REGEX.sub('', name).strip(' _*')
+        if series:
+            return series
+    match = SERIES_TITLE_REGEX.match(title)
+    if match and match.group(1) != '_MEETING_':
+        return match.group(1).strip(' _*')
+    return ''
+
+
+def get_action_time(action):
+    # Actions count as opened when their note was written:
+    #   '2024-01-01_09-00-00_0 | Do the thing' -> '2024-01-01T09:00:00'
+    return f'{action[:10]}T{action[11:19].replace("-", ":")}'
+
+
+def get_week(at):
+    # '2024-01-01T09:00:00' -> '2024-W01', the ISO week
+    year, week, _ = parse_time(at).isocalendar()
+    return f'{year}-W{week:02}'
+
+
+def parse_time(at):
+    return datetime.fromisoformat(at)
+
+
+def split_action(action):
+    # '2024-01-01_09-00-00_0 | Do the thing' -> ('...', '2024-01-01_09-00-00_0', 'Do the thing')
+    action_id, _, text = action.partition(' | ')
+    return action, action_id, text
+
+
+def get_now():
+    return datetime.now().isoformat(timespec='seconds')
@@ -0,0 +1,162 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# A template engine that renders `{{ PLACEHOLDER }}` template directories in a single pass.
+
+import json
+import os
+import re
+import threading
+
+from pathlib import Path
+
+from dev_tools.instrument import count
+
+PLACEHOLDER_REGEX = re.compile(r'\{\{ ([A-Z0-9_ ]+?) \}\}')
+TEMPLATE_CACHE_VERSION = 1
+
+compiled_templates = dict()
+
+
+class TemplateError(Exception):
+    pass
+
+
+def compile_template(template_dir, cache_dir=None):
+    # Splits every path and file of a template directory into alternating
+    # literal text and placeholder names, e.g.
+    #   '{{ TIME STAMP }}.md' -> ['', 'TIME STAMP', '.md']
+    # The result is cached in memory and, given a `cache_dir`, on disk until
+    # any file in the template directory changes.
+    template_dir = Path(template_dir)
+    fingerprint = get_fingerprint(template_dir)
+    template = compiled_templates.get(str(template_dir))
+    if template and template['fingerprint'] == fingerprint:
+        return template
+
+    cache_path = Path(cache_dir) / f'{template_dir.name}.json' if cache_dir else None
+    template = load_compiled_template(cache_path, template_dir, fingerprint)
+    if not template:
+        template = {
+            'version': TEMPLATE_CACHE_VERSION,
+            'source': str(template_dir),
+            'fingerprint': fingerprint,
+            'dirs': list(),
+            'files': list(),
+            }
+        for path in sorted(template_dir.glob('**/*')):
+            relative_path = path.relative_to(template_dir).as_posix()
+            if path.is_dir():
+                template['dirs'].append(tokenise(relative_path))
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8', newline='') as file:
+                    contents = tokenise(file.read())
+            except UnicodeDecodeError:
+                # Binary files are copied across untouched
+                contents = None
+            template['files'].append({
+                'source': relative_path,
+                'path': tokenise(relative_path),
+                'contents': contents,
+                })
+        if cache_path:
+            save_compiled_template(cache_path, template)
+    compiled_templates[str(template_dir)] = template
+    return template
+
+
+def render_template(template, values):
+    # Returns the directories and {relative path: contents} of a template with
+    # every placeholder substituted, raising a TemplateError for any placeholder
+    # that has no value. Binary files are read from the template as bytes.
+    rendered = {'dirs': [substitute(tokens, values) for tokens in template['dirs']], 'files': dict()}
+    for file in template['files']:
+        path = substitute(file['path'], values)
+        if file['contents'] is None:
+            with open(Path(template['source']) / file['source'], 'rb') as source:
+                rendered['files'][path] = source.read()
+        else:
+            rendered['files'][path] = substitute(file['contents'], values)
+    return rendered
+
+
+def write_rendered(rendered, destination):
+    # Writes a rendered template under `destination`, returning the written file
+    # paths. Each file is written to a unique temporary name and then moved into
+    # place, so concurrent renders never see or clobber a half written file.
+    destination = Path(destination)
+    for directory in rendered['dirs']:
+        os.makedirs(destination / directory, exist_ok=True)
+    written = list()
+    for relative_path, contents in rendered['files'].items():
+        path = destination / relative_path
+        os.makedirs(path.parent, exist_ok=True)
+        write_atomic(path, contents)
+        written.append(path)
+    return written
+
+
+def render(template_dir, values, destination, cache_dir=None):
+    return write_rendered(render_template(compile_template(template_dir, cache_dir), values), destination)
+
+
+def tokenise(text):
+    return PLACEHOLDER_REGEX.split(text)
+
+
+def substitute(tokens, values):
+    parts = list()
+    for position, token in enumerate(tokens):
+        if position % 2 == 0:
+            parts.append(token)
+        elif token in values:
+            parts.append(str(values[token]))
+        else:
+            raise TemplateError(f'No value given for template placeholder {{{{ {token} }}}}')
+    return ''.join(parts)
+
+
+def write_atomic(path, contents):
+    temp_path = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    if isinstance(contents, str):
+        contents = contents.encode('utf-8')
+    try:
+        with open(temp_path, 'xb') as file:
+            file.write(contents)
+        os.replace(temp_path, path)
+        count('files written')
+        count('bytes written', len(contents))
+    finally:
+        if temp_path.exists():
+            os.remove(temp_path)
+
+
+def get_fingerprint(template_dir):
+    if not template_dir.is_dir():
+        raise TemplateError(f'Could not find template directory {template_dir}')
+    fingerprint = list()
+    for path in sorted(template_dir.glob('**/*')):
+        stat = os.stat(path)
+        fingerprint.append([path.relative_to(template_dir).as_posix(), stat.st_mtime_ns, stat.st_size])
+    return fingerprint
+
+
+def load_compiled_template(cache_path, template_dir, fingerprint):
+    if not cache_path or not cache_path.is_file():
+        return None
+    try:
+        with open(cache_path, 'r') as file:
+            template = json.load(file)
+    except ValueError:
+        return None
+    if (
+        template.get('version') != TEMPLATE_CACHE_VERSION
+        or template.get('source') != str(template_dir)
+        or template.get('fingerprint') != fingerprint
+        ):
+        return None
+    return template
+
+
+def save_compiled_template(cache_path, template):
+    os.makedirs(cache_path.parent, exist_ok=True)
+    write_atomic(cache_path, json.dumps(template))
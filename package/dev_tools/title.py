@@ -5,30 +5,84 @@ import click
 import shutil
 import os
 import re
+import json
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+from dev_tools import daemon
+from dev_tools.config import load_config, get_notes_dirs
+from dev_tools.instrument import profiled, phase, count, record_error
+from dev_tools.sections import read_title
+from dev_tools.walk import scan_roots, in_date_range, get_date_range
+
+TIMESTAMP_REGEX = r"[0-9]{4}-[0-9]{2}-[0-9]{2}_[0-9]{2}-[0-9]{2}-[0-9]{2}"
+RENAME_WORKERS = 8
+
 @click.command()
-def cli():
-    title_notes()
+@click.option("--dry-run", is_flag=True, help="Preview the renames without applying them.")
+@click.option("--full", is_flag=True, help="Re-examine notes that were already checked.")
+@click.option("--workers", type=int, default=RENAME_WORKERS, help="Threads used to apply the renames.")
+@click.option("--since", default=None, help="Only notes on or after this date, e.g. 2026-09-17, 2026-09, 2026 or yesterday.")
+@click.option("--until", default=None, help="Only notes on or before this date, e.g. 2026-09-17, 2026-09, 2026 or today.")
+@profiled("title")
+def cli(dry_run, full, workers, since, until):
+    title_notes(dry_run=dry_run, full=full, workers=workers, since=since, until=until)
 
-def title_notes():
-    notes_dir = Path.home() / "Notes/"
-    kit_dir = notes_dir / "Meeting Notes" / "Keeping in Touch"
+def title_notes(dry_run=False, full=False, workers=RENAME_WORKERS, since=None, until=None):
+    dev_tools_dir = Path.home() / ".dev-tools"
+    notes_dirs = get_notes_dirs(load_config(dev_tools_dir))
 
     is_successful = False
     error_message = "There was a failure:\n"
     date = datetime.now()
 
     try:
+        since, until = get_date_range(since, until)
         display("~~~ Renaming Meeting Notes ~~~", "green")
-        all_notes = notes_dir.glob('**/*')
-        for note in all_notes:
-            get_name(note)
+        journal_path = dev_tools_dir / "dot-files" / ".dttitles.journal"
+        if not dry_run and journal_path.is_file():
+            display("  - Resuming interrupted renames...")
+            with phase("resume journal"):
+                apply_renames(*read_journal(journal_path), journal_path, workers=workers)
+
+        index_path = dev_tools_dir / "dot-files" / ".dttitles"
+        with phase("load index"):
+            title_index = dict() if full else load_title_index(index_path)
+        with phase("daemon query"):
+            daemon_response = daemon.query("notes")
+        stats = None
+        if daemon_response:
+            all_notes = [
+                Path(note)
+                for note in daemon_response["notes"]
+                if in_date_range(Path(note).name, since, until) and os.path.exists(note)
+                ]
+        else:
+            # Archived notes can't be renamed
+            with phase("walk and stat"):
+                all_notes = stats = scan_roots(notes_dirs, since=since, until=until, archives=False, include=is_untitled)
+        with phase("plan renames"):
+            renames, collisions = plan_renames(all_notes, title_index, stats)
+
+        for note, new_path in collisions:
+            display(f'{note.stem}', "yellow")
+            display(f'\t-x {new_path.stem} already exists, skipping', "yellow")
+        if dry_run:
+            for note, new_path in renames:
+                display(f'{note.stem}')
+                display(f'\t-> {new_path.stem}')
+        else:
+            with phase("apply renames"):
+                apply_renames(renames, set(), journal_path, workers=workers)
+            with phase("save index"):
+                save_title_index(index_path, title_index)
         is_successful = True
     except Exception as e:
         display("There was a failure.", "cyan")
+        record_error(e)
         exception_message = getattr(e, "message", repr(e))
     if is_successful:
         display("Done!", "bright_green")
@@ -38,20 +92,119 @@ def title_notes():
             error_message = "An unknown error occurred"
         display(error_message, "cyan")
 
+def plan_renames(notes, title_index, stats=None):
+    # `title_index` maps untitled notes to the mtime they were checked at, so
+    # notes still called _MEETING_ are only read again after they are edited.
+    # `stats` holds the stat of notes that have already been scanned.
+    renames = list()
+    targets = dict()
+    for note in notes:
+        with phase("regex"):
+            untitled = is_untitled(note)
+        if not untitled:
+            # Not a note, or the filename already carries a title
+            continue
+        mtime = (stats[note] if stats else os.stat(note)).st_mtime_ns
+        count("files stat'ed")
+        if title_index.get(str(note)) == mtime:
+            continue
+        new_path = get_name(note)
+        if new_path:
+            title_index.pop(str(note), None)
+            renames.append((note, new_path))
+            targets[new_path] = targets.get(new_path, 0) + 1
+        else:
+            title_index[str(note)] = mtime
+
+    for path in [path for path in title_index if not os.path.exists(path)]:
+        del title_index[path]
+
+    collisions = [
+        (note, new_path)
+        for note, new_path in renames
+        if targets[new_path] > 1 or new_path.exists()
+        ]
+    renames = [rename for rename in renames if rename not in collisions]
+    return renames, collisions
+
+def is_untitled(note):
+    return bool(re.fullmatch(TIMESTAMP_REGEX, note.stem)) and note.suffix == '.md'
+
 def get_name(note):
-    timestamp_regex = r"[0-9]{4}-[0-9]{2}-[0-9]{2}_[0-9]{2}-[0-9]{2}-[0-9]{2}"
-    file_has_timestamp = re.match(timestamp_regex, note.stem)
-
-    if file_has_timestamp and note.suffix == '.md':
-        timestamp = re.match(f'({timestamp_regex})', note.stem).group(1)
-        with open(note, "r") as file:
-            title = re.match("^# (.*) <", "".join(file.readlines())).group(1)
-        if title != "_MEETING_":
-            meeting_name = ''.join([ i for i in title if i not in r"[{/<:?*|>\}],." ]).strip(' _*')
-            new_path = note.parent/ f'{timestamp} - {meeting_name}.md'
+    timestamp = re.match(f'({TIMESTAMP_REGEX})', note.stem).group(1)
+    title = re.match("^# (.*) <", read_title(note))
+    if not title or title.group(1) == "_MEETING_":
+        return None
+    meeting_name = ''.join([ i for i in title.group(1) if i not in r"[{/<:?*|>\}],." ]).strip(' _*')
+    return note.parent/ f'{timestamp} - {meeting_name}.md'
+
+def apply_renames(renames, done, journal_path, workers=RENAME_WORKERS):
+    # The plan is written to a journal before anything moves and each finished
+    # rename is appended to it, so an interrupted run picks up where it stopped.
+    # Returns (note, new path, renamed) for every rename that was pending.
+    pending = [(note, new_path) for note, new_path in renames if str(note) not in done]
+    if not pending:
+        journal_path.unlink(missing_ok=True)
+        return list()
+    os.makedirs(journal_path.parent, exist_ok=True)
+    if not done:
+        with open(journal_path, 'w') as journal:
+            journal.write(json.dumps({'plan': [[str(note), str(new_path)] for note, new_path in renames]}) + '\n')
+    journal_lock = threading.Lock()
+
+    def rename(note, new_path):
+        # A note removed or a title taken since the plan was made is skipped
+        renamed = note.exists() and not new_path.exists()
+        if renamed:
             os.rename(note, new_path)
-            display(f'{note.stem}')
-            display(f'\t-> {new_path.stem}')
+            count("files renamed")
+        with journal_lock:
+            with open(journal_path, 'a') as journal:
+                journal.write(json.dumps({'done': str(note)}) + '\n')
+            if renamed:
+                display(f'{note.stem}')
+                display(f'\t-> {new_path.stem}')
+            else:
+                display(f'{note.stem}', "yellow")
+                display(f'\t-x {new_path.stem} could not be renamed, skipping', "yellow")
+        return note, new_path, renamed
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        results = list(executor.map(lambda plan: rename(*plan), pending))
+    journal_path.unlink()
+    return results
+
+def read_journal(journal_path):
+    renames = list()
+    done = set()
+    with open(journal_path, 'r') as journal:
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The run was interrupted mid-write
+                continue
+            if 'plan' in entry:
+                renames = [(Path(note), Path(new_path)) for note, new_path in entry['plan']]
+            elif 'done' in entry:
+                done.add(entry['done'])
+    return renames, done
+
+def load_title_index(index_path):
+    if not index_path.is_file():
+        return dict()
+    try:
+        with open(index_path, 'r') as file:
+            return json.load(file)
+    except ValueError:
+        return dict()
+
+def save_title_index(index_path, title_index):
+    os.makedirs(index_path.parent, exist_ok=True)
+    temp_path = index_path.with_name(f'{index_path.name}.{os.getpid()}.tmp')
+    with open(temp_path, 'w') as file:
+        json.dump(title_index, file)
+    os.replace(temp_path, index_path)
 
 
 
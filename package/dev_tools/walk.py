@@ -0,0 +1,228 @@
+### © Copyright 2024 Frankie Homewood <F.Homewood@outlook.com>
+# Walks the notes tree, skipping the year, month and day folders outside a date range.
+
+import click
+import heapq
+import os
+import re
+
+from datetime import date, timedelta
+from pathlib import Path
+
+from dev_tools.archive import ARCHIVE_SUFFIX, list_archived_notes, split_archived_path, stat_note
+from dev_tools.instrument import phase, count
+
+TIMESTAMP_REGEX = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2}_[0-9]{2}-[0-9]{2}-[0-9]{2}')
+# Meeting writes notes to notes_dir/%Y/%m-%B/%d-%A
+YEAR_REGEX = re.compile(r'[0-9]{4}')
+MONTH_OR_DAY_REGEX = re.compile(r'([0-9]{2})-\w+')
+
+
+def walk_notes(notes_dir, since=None, until=None, archives=True, reverse=False):
+    # Yields every .md file under `notes_dir` in name order, which is oldest
+    # first within the dated folders, or newest first with `reverse`. Given a
+    # [since, until) range, year, month and day folders outside it are never
+    # listed, and every other note must have a name starting with a timestamp
+    # in the range. No file is opened. The notes of archived years follow their
+    # year, listed from the archive's index, unless `archives` is False.
+    yield from walk_entries(list_directory(notes_dir, reverse), '', since, until, archives, reverse)
+
+
+def walk_notes_by_name(notes_dir, since=None, until=None, archives=True, reverse=False):
+    # Yields the notes of walk_notes sorted by name, so by timestamp. The dated
+    # folders already give their notes in that order and are only listed as
+    # notes are asked for, so a caller after the newest few stops early. Notes
+    # anywhere else, like KITs, and those of archives are sorted up front and
+    # merged in.
+    dated = list()
+    undated = list()
+    for entry in list_directory(notes_dir, reverse):
+        (dated if entry.is_dir() and YEAR_REGEX.fullmatch(entry.name) else undated).append(entry)
+    yield from heapq.merge(
+        walk_entries(dated, '', since, until, archives, reverse),
+        sorted(walk_entries(undated, '', since, until, archives, reverse), key=get_name, reverse=reverse),
+        key=get_name,
+        reverse=reverse,
+        )
+
+
+def walk_roots_by_name(notes_dirs, since=None, until=None, archives=True, reverse=False):
+    # Yields the notes of every root merged by name, each root walked as
+    # walk_notes_by_name walks one, so a caller after the newest few still
+    # stops early. A note found in more than one root is yielded once.
+    if len(notes_dirs) == 1:
+        yield from walk_notes_by_name(notes_dirs[0], since, until, archives, reverse)
+        return
+    walks = [
+        get_relative_notes(notes_dir, walk_notes_by_name(notes_dir, since, until, archives, reverse))
+        for notes_dir in notes_dirs
+        ]
+    for *_, path in merge_roots(walks, reverse):
+        yield path
+
+
+def scan_roots(notes_dirs, since=None, until=None, archives=True, reverse=False, include=None):
+    # Walks and stats the notes of every root at once, each root on its own
+    # thread so a slow network mount holds up none of the others. Returns
+    # {note path: stat} in name order, a note found in more than one root
+    # only kept from the first, and given an `include` function only the notes
+    # it accepts. Each root is timed as its own phase.
+    def scan_root(notes_dir):
+        with phase(f'scan {notes_dir}'):
+            paths = walk_notes_by_name(notes_dir, since, until, archives, reverse)
+            stats = {path: stat_note(path) for path in paths if include is None or include(path)}
+        count(f'notes in {notes_dir}', len(stats))
+        return stats
+
+    # Only imported here, listing actions with --limit never needs a thread
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=len(notes_dirs)) as executor:
+        scanned = list(executor.map(scan_root, notes_dirs))
+    if len(scanned) == 1:
+        return scanned[0]
+    walks = [get_relative_notes(notes_dir, stats) for notes_dir, stats in zip(notes_dirs, scanned)]
+    all_stats = dict()
+    for stats in scanned:
+        all_stats.update(stats)
+    return {path: all_stats[path] for *_, path in merge_roots(walks, reverse)}
+
+
+def get_relative_notes(notes_dir, paths):
+    # Pairs each note with its path below its root, which an archived note
+    # shares with the live note it was packed from, and with its real path,
+    # which it shares with itself walked from a root holding its own root
+    prefix = len(str(notes_dir)) + 1
+    real_dir = os.path.realpath(notes_dir)
+    for path in paths:
+        relative_path = str(path)[prefix:]
+        archived = split_archived_path(path)
+        yield (
+            archived[1] if archived else relative_path.replace(os.sep, '/'),
+            os.path.join(real_dir, relative_path),
+            path,
+            )
+
+
+def merge_roots(walks, reverse=False):
+    # Merges the name ordered notes of each root, keeping the first root's
+    # copy of a note found in several, e.g. one synced into both a personal
+    # and a shared folder, matched on their path below their root, or one
+    # under a personal root kept inside a shared one, matched on its real path.
+    seen_relative = set()
+    seen_real = set()
+    for note in heapq.merge(*walks, key=get_note_name, reverse=reverse):
+        if note[0] in seen_relative or note[1] in seen_real:
+            count('duplicate notes')
+            continue
+        seen_relative.add(note[0])
+        seen_real.add(note[1])
+        yield note
+
+
+def get_note_name(note):
+    return note[-1].name
+
+
+def list_directory(directory, reverse=False):
+    try:
+        with os.scandir(directory) as scanned:
+            return sorted(scanned, key=get_name, reverse=reverse)
+    except FileNotFoundError:
+        return list()
+
+
+def walk_entries(entries, prefix, since, until, archives=True, reverse=False):
+    # `prefix` is the date every note below shares, e.g. '2026-09' in a month
+    # folder, '' at the top of the tree and None outside the dated folders.
+    for entry in entries:
+        if entry.is_dir():
+            entry_prefix = get_folder_prefix(prefix, entry.name)
+            if entry_prefix and is_outside_range(entry_prefix, since, until):
+                count('folders pruned')
+                continue
+            yield from walk_entries(list_directory(entry.path, reverse), entry_prefix, since, until, archives, reverse)
+        elif entry.name.endswith('.md') and in_date_range(entry.name, since, until):
+            yield Path(entry.path)
+        elif archives and prefix == '' and entry.name.endswith(ARCHIVE_SUFFIX):
+            year = entry.name[:-len(ARCHIVE_SUFFIX)]
+            if YEAR_REGEX.fullmatch(year) and is_outside_range(year, since, until):
+                count('folders pruned')
+                continue
+            paths = list_archived_notes(Path(entry.path))
+            for path in reversed(paths) if reverse else paths:
+                if in_date_range(path.name, since, until):
+                    yield path
+
+
+def get_name(entry):
+    return entry.name
+
+
+def get_folder_prefix(prefix, name):
+    if prefix == '' and YEAR_REGEX.fullmatch(name):
+        return name
+    if prefix and len(prefix) < len('YYYY-MM-DD'):
+        match = MONTH_OR_DAY_REGEX.fullmatch(name)
+        if match:
+            return f'{prefix}-{match.group(1)}'
+    return None
+
+
+def is_outside_range(prefix, since=None, until=None):
+    # Every timestamp below a folder starts with its prefix
+    if until and prefix >= until:
+        return True
+    return bool(since) and prefix < since[:len(prefix)]
+
+
+def in_date_range(name, since=None, until=None):
+    # Note names and action ids start with the note's timestamp, e.g.
+    #   2026-09-17_10-00-00 - Sync.md
+    if not since and not until:
+        return True
+    match = TIMESTAMP_REGEX.match(name)
+    if not match:
+        return False
+    timestamp = match.group(0)
+    return (not since or timestamp >= since) and (not until or timestamp < until)
+
+
+def get_date_range(since=None, until=None, quarter=None):
+    # Returns the [since, until) bounds compared against note timestamps, e.g.
+    # '2026-Q3' -> ('2026-07-01', '2026-10-01') and ('2026-09', '2026-09') ->
+    # ('2026-09', '2026-10'). Both dates given are inclusive.
+    if quarter:
+        match = re.fullmatch(r'([0-9]{4})-?[Qq]([1-4])', quarter)
+        if not match:
+            raise click.BadParameter(f'{quarter} is not a quarter like 2026-Q3', param_hint='--quarter')
+        year, number = int(match.group(1)), int(match.group(2))
+        since = date(year, number * 3 - 2, 1).isoformat()
+        until = (date(year + number // 4, number % 4 * 3 + 1, 1) - timedelta(days=1)).isoformat()
+    if since:
+        since = parse_date(since, '--since')[0]
+    if until:
+        until = parse_date(until, '--until')[1]
+    return since, until
+
+
+def parse_date(value, param_hint=None):
+    # Returns the start of a year, month or day and the start of the next one
+    value = value.strip().lower()
+    if value in ('today', 'yesterday'):
+        day = date.today() - timedelta(days=int(value == 'yesterday'))
+        return day.isoformat(), (day + timedelta(days=1)).isoformat()
+    if YEAR_REGEX.fullmatch(value):
+        return value, f'{int(value) + 1:04}'
+    match = re.fullmatch(r'([0-9]{4})-([0-9]{2})', value)
+    if match and 1 <= int(match.group(2)) <= 12:
+        year, month = int(match.group(1)), int(match.group(2))
+        return value, f'{year + month // 12:04}-{month % 12 + 1:02}'
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        raise click.BadParameter(
+            f'{value} is not a date like 2026-09-17, 2026-09, 2026 or yesterday',
+            param_hint=param_hint,
+            )
+    return day.isoformat(), (day + timedelta(days=1)).isoformat()
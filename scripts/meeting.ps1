@@ -50,7 +50,8 @@ function New-Meeting {
         # # Define values to replace
         $placeholders = @(
             @{  Tag = '{{ TIME STAMP }}';   Inplace = "$($date.ToString("yyyy-MM-dd_hh-mm-ss"))";   },
-            @{  Tag = '{{ LONG DATE }}';    Inplace = "$($date.ToString("dddd, d MMM yyyy"))";      }
+            @{  Tag = '{{ LONG DATE }}';    Inplace = "$($date.ToString("dddd, d MMM yyyy"))";      },
+            @{  Tag = '{{ TITLE }}';        Inplace = "_MEETING_";                                  }
         )
 
 
@@ -230,7 +231,8 @@ function New-Daily {
         # Define values to replace
         $placeholders = @(
             @{  Tag = '{{ TIME STAMP }}';    Inplace = "$($date.ToString("yyyy-MM-dd_hh-mm-ss"))";   },
-            @{  Tag = '{{ LONG DATE }}';     Inplace = "$($date.ToString("dddd, d MMM yyyy"))";      }
+            @{  Tag = '{{ LONG DATE }}';     Inplace = "$($date.ToString("dddd, d MMM yyyy"))";      },
+            @{  Tag = '{{ ACTIONS }}';       Inplace = "- ";                                         }
         )
 
         Write-Host "  - Replacing placeholder filenames..." -ForegroundColor Cyan